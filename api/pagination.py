@@ -0,0 +1,58 @@
+from collections import OrderedDict
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from posts.paginators import InvalidCursor
+from posts.settings import POSTS_QUANTITY
+from posts.timeline import TimelinePaginator
+
+
+class PostCursorPagination(CursorPagination):
+    """Курсор по (-pub_date, -id), как у HTML-ленты: без COUNT(*)."""
+
+    page_size = POSTS_QUANTITY
+    ordering = ('-pub_date', '-id')
+
+
+class CommentCursorPagination(CursorPagination):
+    page_size = 50
+    ordering = ('created', 'id')
+
+
+class TimelinePagination(BasePagination):
+    """
+    Лента подписок курсором posts.timeline.TimelinePaginator: тот же
+    порядок и ответ, что у PostCursorPagination, но страница читается
+    по индексу ленты.
+    """
+
+    page_size = POSTS_QUANTITY
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = TimelinePaginator(request.user, queryset, self.page_size)
+        try:
+            self.page = paginator.page(
+                request.query_params.get(self.cursor_query_param)
+            )
+        except InvalidCursor:
+            raise NotFound('Неверный курсор')
+        return list(self.page)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, cursor
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_link(self.page.next_cursor)),
+            ('previous', self.get_link(self.page.previous_cursor)),
+            ('results', data),
+        ]))
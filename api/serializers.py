@@ -0,0 +1,49 @@
+from rest_framework import serializers
+
+from posts.models import Comment, Group, Post
+
+
+class FieldsMixin:
+    """
+    Оставляет в ответе только поля из ?fields=a,b,c, чтобы клиент не
+    тянул то, что не отображает. Неизвестные имена пропускаются.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields = request and request.query_params.get('fields')
+        if fields:
+            allowed = set(fields.split(','))
+            for name in set(self.fields) - allowed:
+                self.fields.pop(name)
+
+
+class GroupSerializer(FieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Group
+        fields = ('id', 'title', 'slug', 'description')
+
+
+class PostSerializer(FieldsMixin, serializers.ModelSerializer):
+    author = serializers.SlugRelatedField(
+        slug_field='username', read_only=True
+    )
+    group = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+
+    class Meta:
+        model = Post
+        fields = (
+            'id', 'text', 'author', 'group', 'pub_date', 'image',
+            'comment_count',
+        )
+
+
+class CommentSerializer(FieldsMixin, serializers.ModelSerializer):
+    author = serializers.SlugRelatedField(
+        slug_field='username', read_only=True
+    )
+
+    class Meta:
+        model = Comment
+        fields = ('id', 'post', 'author', 'text', 'created')
@@ -0,0 +1,108 @@
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.settings import POSTS_QUANTITY
+
+POSTS = reverse('posts-list')
+GROUPS = reverse('groups-list')
+FOLLOW = reverse('follow-list')
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='test_title',
+            slug='test-group',
+            description='test_description',
+        )
+        cls.author = User.objects.create_user(username='TestUser')
+        cls.reader = User.objects.create_user(username='TestReader')
+        Post.objects.bulk_create(
+            Post(text='Тестовый текст %s' % i, author=cls.author,
+                 group=cls.group)
+            for i in range(POSTS_QUANTITY + 3)
+        )
+        cls.post = Post.objects.first()
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.COMMENTS = reverse('comments-list', args=[cls.post.id])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.reader_client = APIClient()
+        self.reader_client.credentials(
+            HTTP_AUTHORIZATION='Token ' + Token.objects.create(
+                user=self.reader
+            ).key
+        )
+
+    def test_posts_cursor_pagination(self):
+        expected = list(Post.objects.order_by('-pub_date', '-id').values_list(
+            'id', flat=True
+        ))
+        with self.assertNumQueries(1):
+            first = self.client.get(POSTS).json()
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual(
+            [post['id'] for post in first['results'] + second['results']],
+            expected,
+        )
+        self.assertEqual(first['results'][0]['author'], 'TestUser')
+        self.assertEqual(first['results'][0]['group'], 'test-group')
+
+    def test_fields_selection(self):
+        response = self.client.get(POSTS, {'fields': 'id,text'})
+        self.assertEqual(
+            set(response.json()['results'][0]), {'id', 'text'}
+        )
+
+    def test_endpoints(self):
+        cases = {
+            reverse('posts-detail', args=[self.post.id]): 'text',
+            GROUPS: 'slug',
+            reverse('groups-detail', args=[self.group.slug]): 'title',
+            self.COMMENTS: 'results',
+        }
+        for url, key in cases.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                data = response.json()
+                self.assertIn(key, data[0] if isinstance(data, list) else data)
+        self.assertEqual(
+            self.client.get(reverse('comments-list', args=[0])).status_code,
+            404,
+        )
+
+    def test_follow_feed_needs_auth(self):
+        self.assertEqual(self.client.get(FOLLOW).status_code, 401)
+        response = self.reader_client.get(FOLLOW)
+        self.assertEqual(len(response.json()['results']), POSTS_QUANTITY)
+        response = self.reader_client.get(response.json()['next'])
+        self.assertEqual(len(response.json()['results']), 3)
+        self.assertIsNone(response.json()['next'])
+        self.assertIsNotNone(response.json()['previous'])
+        response = self.reader_client.get(FOLLOW, {'cursor': 'плохой'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_conditional_get(self):
+        """Повторный запрос с ETag получает 304, пока данные не менялись."""
+        response = self.client.get(self.COMMENTS)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.COMMENTS, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Новый комментарий'
+        )
+        response = self.client.get(self.COMMENTS, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
@@ -0,0 +1,90 @@
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework import mixins, viewsets
+from rest_framework.permissions import AllowAny, IsAuthenticated
+
+from posts.cache import FEED, page_etag, post_scope, timeline_scope
+from posts.models import Group, Post
+
+from .pagination import (CommentCursorPagination, PostCursorPagination,
+                         TimelinePagination)
+from .serializers import CommentSerializer, GroupSerializer, PostSerializer
+
+
+class ConditionalMixin:
+    """
+    ETag из версий кэша posts.cache: пока данные не менялись, запрос с
+    If-None-Match получает 304, не трогая БД и сериализаторы.
+    """
+
+    def get_etag_scopes(self):
+        return (FEED,)
+
+    def conditional(self, view, request, *args, **kwargs):
+        etag = quote_etag(page_etag(request, *self.get_etag_scopes()))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = view(request, *args, **kwargs)
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+
+class PostViewSet(ConditionalMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = PostSerializer
+    pagination_class = PostCursorPagination
+    permission_classes = (AllowAny,)
+
+    def get_queryset(self):
+        posts = Post.objects.for_feed()
+        group = self.request.query_params.get('group')
+        if group:
+            posts = posts.filter(group__slug=group)
+        author = self.request.query_params.get('author')
+        if author:
+            posts = posts.filter(author__username=author)
+        return posts
+
+
+class GroupViewSet(ConditionalMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Group.objects.order_by('id')
+    serializer_class = GroupSerializer
+    permission_classes = (AllowAny,)
+    lookup_field = 'slug'
+
+
+class CommentViewSet(ConditionalMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = CommentSerializer
+    pagination_class = CommentCursorPagination
+    permission_classes = (AllowAny,)
+
+    def get_etag_scopes(self):
+        return (post_scope(self.kwargs['post_id']),)
+
+    def get_queryset(self):
+        post = get_object_or_404(
+            Post.objects.only('id'), pk=self.kwargs['post_id']
+        )
+        return post.comments.for_thread()
+
+
+class FollowViewSet(ConditionalMixin, mixins.ListModelMixin,
+                    viewsets.GenericViewSet):
+    """Лента подписок текущего пользователя."""
+
+    serializer_class = PostSerializer
+    pagination_class = TimelinePagination
+    permission_classes = (IsAuthenticated,)
+
+    def get_etag_scopes(self):
+        return (FEED, timeline_scope(self.request.user.id))
+
+    def get_queryset(self):
+        # Посты ленты выбирает TimelinePagination.
+        return Post.objects.for_feed()
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     name = 'posts'
     verbose_name = 'посты'
+
+    def ready(self):
+        from yatube import database  # noqa: F401
+
+        from . import signals  # noqa: F401
@@ -0,0 +1,39 @@
+"""
+Обход всех постов пачками для команд обслуживания.
+
+Команды вроде generate_variants и warm_thumbnails читают посты одним
+потоковым запросом и отдают их пулу потоков. map() ставит в очередь
+сразу всё, что ему дали, поэтому пулу уходит пачка за пачкой, а не
+весь запрос целиком.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.db import connections
+
+
+def run(func, items, workers, batch_size):
+    """
+    Вызывает func для каждого элемента items и возвращает их число.
+    При workers <= 1 - без пула, в текущем потоке.
+    """
+    if workers <= 1:
+        done = 0
+        for item in items:
+            func(item)
+            done += 1
+        return done
+
+    def call(item):
+        try:
+            return func(item)
+        finally:
+            # Соединения потоков пула сами не закрываются.
+            connections.close_all()
+
+    items = iter(items)
+    done = 0
+    with ThreadPoolExecutor(workers) as executor:
+        for batch in iter(lambda: list(islice(items, batch_size)), []):
+            done += len(list(executor.map(call, batch)))
+    return done
@@ -0,0 +1,193 @@
+"""
+Замеры страниц через тестовый клиент: задержка p50/p95, число запросов
+к БД и размер ответа по каждому сценарию, сравнение с сохранённым
+эталоном. Запускается командой benchmark на отдельной тестовой базе.
+"""
+import gc
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Max
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import transfer
+from posts.models import Post, User
+
+USERNAME = 'bench_user_{}'
+GROUP_SLUG = 'bench-group-{}'
+
+
+def seed(users=50, groups=5, posts=2000, comments=5000, follows=500,
+         batch_size=2000, random_seed=0, stdout=None):
+    """Наполняет базу через тот же Importer, что и import_posts."""
+    rng = random.Random(random_seed)
+    names = [USERNAME.format(i) for i in range(users)]
+    first_id = (Post.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+    post_ids = range(first_id, first_id + posts)
+    now = timezone.now()
+    importer = transfer.Importer(batch_size)
+    for post_id in post_ids:
+        importer.add({
+            'model': 'post',
+            'id': post_id,
+            'text': f'Тестовый пост {post_id} ' * rng.randint(1, 20),
+            'author': rng.choice(names),
+            'group': GROUP_SLUG.format(rng.randrange(groups)) if (
+                groups and rng.random() < 0.7
+            ) else None,
+            'pub_date': (now - timedelta(minutes=post_id)).isoformat(),
+        })
+    for _ in range(comments):
+        importer.add({
+            'model': 'comment',
+            'post': rng.choice(post_ids),
+            'author': rng.choice(names),
+            'text': 'Комментарий ' * rng.randint(1, 10),
+        })
+    pairs = set()
+    while len(pairs) < min(follows, users * (users - 1)):
+        user, author = rng.sample(names, 2)
+        pairs.add((user, author))
+    for user, author in pairs:
+        importer.add({'model': 'follow', 'user': user, 'author': author})
+    importer.flush()
+    transfer.reset_sequences()
+    transfer.rebuild(stdout)
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+class Scenarios:
+    """URL и данные запросов; меняются от итерации к итерации."""
+
+    def __init__(self, random_seed=0):
+        self.rng = random.Random(random_seed)
+        self.reader = User.objects.annotate(
+            following_count=Count('follower')
+        ).order_by('-following_count', 'pk').first()
+        self.authors = list(User.objects.annotate(
+            total=Count('posts')
+        ).filter(total__gt=0).values_list('username', flat=True))
+        self.posts = list(Post.objects.values_list(
+            'id', 'author__username'
+        )[:500])
+        self.groups = list(Post.objects.filter(
+            group__isnull=False
+        ).values_list('group__slug', flat=True).distinct())
+
+    def post(self):
+        post_id, username = self.rng.choice(self.posts)
+        return username, post_id
+
+    def __iter__(self):
+        yield 'index', 'get', lambda: (reverse('index'), None)
+        if self.groups:
+            yield 'group_posts', 'get', lambda: (reverse(
+                'group_posts', args=[self.rng.choice(self.groups)]
+            ), None)
+        yield 'profile', 'get', lambda: (reverse(
+            'profile', args=[self.rng.choice(self.authors)]
+        ), None)
+        yield 'post_view', 'get', lambda: (
+            reverse('post', args=self.post()), None
+        )
+        yield 'follow_index', 'get', lambda: (reverse('follow_index'), None)
+        yield 'add_comment', 'post', lambda: (
+            reverse('add_comment', args=self.post()),
+            {'text': 'Комментарий из замера'},
+        )
+        yield 'new_post', 'post', lambda: (
+            reverse('new_post'), {'text': 'Пост из замера'}
+        )
+
+
+def run(iterations=50, warm=False, random_seed=0):
+    """
+    Замеряет все сценарии. Без warm кэш очищается перед каждым
+    запросом, то есть меряется полная отрисовка страницы.
+    """
+    scenarios = Scenarios(random_seed)
+    client = Client()
+    client.force_login(scenarios.reader)
+    results = {}
+    for name, method, request in scenarios:
+        send = getattr(client, method)
+        # Первый запрос не считается: он прогревает шаблоны и счётчики.
+        send(*request())
+        timings, queries, sizes = [], [], []
+        for _ in range(iterations):
+            url, data = request()
+            if not warm:
+                cache.clear()
+            # Как timeit: сборщик мусора не вклинивается в замер.
+            gc.collect()
+            gc.disable()
+            try:
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = send(url, data) if data else send(url)
+                    timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                gc.enable()
+            if response.status_code not in (200, 302):
+                raise AssertionError(
+                    f'{name}: {url} ответил {response.status_code}'
+                )
+            queries.append(len(captured))
+            sizes.append(len(response.content))
+        results[name] = {
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'queries': max(queries),
+            'bytes': percentile(sizes, 0.5),
+        }
+    return results
+
+
+def compare(results, baseline, tolerance=0.25, slack_ms=2.0):
+    """
+    Регрессии относительно эталона: рост числа запросов или p95
+    больше чем на tolerance (и больше чем на slack_ms, чтобы шум на
+    быстрых страницах не считался регрессией).
+    """
+    regressions = []
+    for name, current in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if current['queries'] > expected['queries']:
+            regressions.append(
+                f'{name}: запросов {current["queries"]} '
+                f'вместо {expected["queries"]}'
+            )
+        limit = max(
+            expected['p95_ms'] * (1 + tolerance),
+            expected['p95_ms'] + slack_ms,
+        )
+        if current['p95_ms'] > limit:
+            regressions.append(
+                f'{name}: p95 {current["p95_ms"]} мс '
+                f'вместо {expected["p95_ms"]} мс'
+            )
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as stream:
+        return json.load(stream)
+
+
+def save_baseline(results, path):
+    with open(path, 'w', encoding='utf-8') as stream:
+        json.dump(results, stream, indent=2, sort_keys=True)
+        stream.write('\n')
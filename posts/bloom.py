@@ -0,0 +1,46 @@
+"""
+Фильтр Блума для сборщика файлов (команда gc_media).
+
+Множество строк в битовом массиве: около 10 бит на элемент при 1%
+ложных срабатываний, сколько бы длинными ни были имена файлов.
+Ложных промахов у фильтра нет: если имени в нём не нашлось, его точно
+не добавляли. Соль случайна, поэтому ложные срабатывания в каждом
+запуске свои.
+"""
+import hashlib
+import math
+import os
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01, salt=None):
+        capacity = max(capacity, 1)
+        size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(size / capacity * math.log(2)))
+        # На паре десятков бит позиции хэшей часто совпадают,
+        # и ложных срабатываний много больше расчётных.
+        self.size = max(size, 1024)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.salt = os.urandom(16) if salt is None else salt
+
+    def positions(self, item):
+        # Двойное хэширование: k позиций из одного 128-битного хэша.
+        digest = hashlib.blake2b(
+            item.encode(), digest_size=16, key=self.salt
+        ).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return (
+            (first + index * step) % self.size
+            for index in range(self.hashes)
+        )
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(
+            self.bits[position >> 3] & 1 << (position & 7)
+            for position in self.positions(item)
+        )
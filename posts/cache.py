@@ -0,0 +1,184 @@
+import hashlib
+import math
+import random
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from posts.settings import (CACHE_LOCK_TIMEOUT, CACHE_RECOMPUTE_BETA,
+                            CACHE_STALE_TTL)
+
+FEED = 'feed'
+GROUPS = 'groups'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def timeline_scope(user_id):
+    return f'timeline:{user_id}'
+
+
+def profile_scope(username):
+    return f'profile:{username}'
+
+
+def _version_key(scope):
+    return f'version:{scope}'
+
+
+def _new_version():
+    return format(time.time_ns(), 'x')
+
+
+def get_versions(*scopes):
+    """
+    Версии областей кэша одним обращением к кэшу. Потерянная версия
+    заменяется новой, поэтому старые фрагменты уже не совпадут по ключу.
+    """
+    keys = {_version_key(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {scope: found[key] for key, scope in keys.items()}
+
+
+def bump_versions(*scopes):
+    def bump():
+        cache.set_many(
+            {_version_key(scope): _new_version() for scope in scopes}, None
+        )
+    # Второй сдвиг после коммита не даёт закэшировать фрагмент,
+    # отрисованный по ещё не закоммиченным данным.
+    bump()
+    transaction.on_commit(bump)
+
+
+def get_or_set(key, producer, timeout, beta=CACHE_RECOMPUTE_BETA,
+               stale_key=None):
+    """
+    cache.get_or_set для горячих ключей. Значение пересчитывается чуть
+    раньше срока с вероятностью, растущей к его концу (XFetch), а
+    пересчитывает его только тот, кто взял блокировку: остальные сразу
+    получают прежнее значение, оно живёт в кэше ещё CACHE_STALE_TTL
+    после срока.
+
+    Версионные ключи после сдвига версии пусты. Для них stale_key —
+    постоянный ключ без версий, под которым лежит последнее значение:
+    пока один пересчитывает, остальные отдают его, а не считают сами.
+    Без него (или пока там пусто) значение считают сами, не дожидаясь
+    чужого пересчёта.
+    """
+    lock_key = f'lock:{key}'
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires_at, delta = entry
+        early = delta * beta * math.log(1 - random.random())
+        if time.time() - early < expires_at:
+            return value
+        if not cache.add(lock_key, True, CACHE_LOCK_TIMEOUT):
+            return value
+        locked = True
+    else:
+        locked = cache.add(lock_key, True, CACHE_LOCK_TIMEOUT)
+        if not locked and stale_key is not None:
+            stale = cache.get(stale_key)
+            if stale is not None:
+                return stale
+    try:
+        started = time.time()
+        value = producer()
+        finished = time.time()
+        entries = {key: (value, finished + timeout, finished - started)}
+        if stale_key is not None:
+            entries[stale_key] = value
+        cache.set_many(entries, timeout + CACHE_STALE_TTL)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
+
+
+def delete(key):
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def page_etag(request, *scopes):
+    """
+    ETag страницы без её отрисовки: версии областей, из которых она
+    собрана, адрес с параметрами и пользователь. Стоит одного get_many.
+    """
+    parts = list(get_versions(*scopes).values())
+    parts += [request.get_full_path(), str(request.user.id)]
+    return hashlib.md5(':'.join(parts).encode()).hexdigest()
+
+
+def feed_etag(request, *args, **kwargs):
+    return page_etag(request, FEED)
+
+
+def follow_etag(request):
+    return page_etag(request, FEED, timeline_scope(request.user.id))
+
+
+def profile_etag(request, username):
+    # Подписки читателя меняют кнопку «Подписаться» на странице.
+    return page_etag(
+        request, FEED, profile_scope(username),
+        timeline_scope(request.user.id),
+    )
+
+
+def post_etag(request, username, post_id):
+    # Без FEED: чужие посты и комментарии страницу записи не меняют.
+    # Группа поста тут неизвестна, поэтому правка любой группы
+    # сдвигает общую область GROUPS.
+    return page_etag(
+        request, GROUPS, post_scope(post_id), profile_scope(username)
+    )
+
+
+def prepare_feed(request, page, scope=None):
+    """
+    Проставляет странице и постам ключи для кэша фрагментов feed.html.
+    Страница зависит от пользователя, только если на ней есть его посты:
+    у них в карточке ссылка на редактирование. Личная лента передаёт
+    свою область scope, и её версия тоже входит в ключ страницы.
+    """
+    posts = list(page)
+    scopes = [FEED]
+    if scope is not None:
+        scopes.append(scope)
+    for post in posts:
+        scopes.append(post_scope(post.id))
+        if post.group_id:
+            scopes.append(group_scope(post.group_id))
+    versions = get_versions(*scopes)
+    user_id = request.user.id
+    for post in posts:
+        post.editable = user_id is not None and post.author_id == user_id
+        post.cache_version = '{}.{}.{}'.format(
+            versions[post_scope(post.id)],
+            versions.get(group_scope(post.group_id), ''),
+            post.comment_count,
+        )
+    place = (
+        request.path,
+        request.GET.urlencode(),
+        str(user_id) if any(post.editable for post in posts) else '',
+    )
+    page.cache_key = ':'.join(
+        (versions[FEED], versions.get(scope, '')) + place
+    )
+    # Та же страница без версий: её прошлая отрисовка, пока новую считают.
+    page.stale_key = ':'.join(('stale', scope or '') + place)
+    return page
@@ -0,0 +1,217 @@
+"""
+Отложенная запись комментариев.
+
+При COMMENT_QUEUE add_comment только проверяет форму и кладёт
+комментарий в локальную очередь: файл SQLite (COMMENT_QUEUE_PATH),
+который переживает перезапуск процесса. Запросы не ждут блокировку
+записи общей базы. Фоновый поток раз в COMMENT_FLUSH_INTERVAL секунд
+забирает из очереди пачку и пишет её одной вставкой, а счётчики
+комментариев её постов пересчитывает одним UPDATE.
+
+У каждой строки очереди свой ключ (Comment.queue_key) и время отправки.
+Если процесс упал между записью пачки в базу и её удалением из очереди,
+повторная запись пропускает уже записанные строки, а дата комментария —
+время отправки, а не записи.
+
+Очередь локальна для хоста: пока комментарий в ней, его автор видит его
+под постом (pending_for), только если запрос попал на тот же хост, а
+остальные — после записи в базу. Очередь рассчитана на один хост или
+на балансировщик, закрепляющий пользователя за хостом; с потерей диска
+хоста теряются и незаписанные комментарии.
+"""
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone as django_timezone
+
+from posts import cache, search
+from posts.models import (Comment, Post, User, bulk_insert_raw,
+                          count_related)
+from posts.settings import COMMENT_BATCH_SIZE, COMMENT_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+CREATE_TABLE = (
+    'CREATE TABLE IF NOT EXISTS comments ('
+    'id INTEGER PRIMARY KEY AUTOINCREMENT, post_id INTEGER NOT NULL, '
+    'author_id INTEGER NOT NULL, text TEXT NOT NULL, key TEXT, created REAL)'
+)
+# Столбцы, которых нет в файлах очереди прежнего формата.
+ADDED_COLUMNS = (('key', 'TEXT'), ('created', 'REAL'))
+CREATE_INDEX = (
+    'CREATE INDEX IF NOT EXISTS comments_post_author '
+    'ON comments (post_id, author_id)'
+)
+
+_local = threading.local()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def enabled():
+    return settings.COMMENT_QUEUE
+
+
+def spool():
+    """Соединение потока с файлом очереди."""
+    path = settings.COMMENT_QUEUE_PATH
+    if getattr(_local, 'path', None) != path:
+        # isolation_level=None: транзакции открываются явно.
+        connection = sqlite3.connect(
+            path, timeout=settings.SQLITE_PRAGMAS['busy_timeout'] / 1000,
+            isolation_level=None,
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(CREATE_TABLE)
+        columns = {
+            row[1] for row in connection.execute('PRAGMA table_info(comments)')
+        }
+        for name, kind in ADDED_COLUMNS:
+            if name not in columns:
+                connection.execute(
+                    f'ALTER TABLE comments ADD COLUMN {name} {kind}'
+                )
+        connection.execute(CREATE_INDEX)
+        _local.connection, _local.path = connection, path
+    return _local.connection
+
+
+def enqueue(comment):
+    """Кладёт несохранённый комментарий в очередь."""
+    spool().execute(
+        'INSERT INTO comments (post_id, author_id, text, key, created) '
+        'VALUES (?, ?, ?, ?, ?)',
+        [comment.post_id, comment.author_id, comment.text,
+         uuid.uuid4().hex, time.time()],
+    )
+    # Новая версия поста меняет ETag страницы: автор не получит 304
+    # и увидит свой комментарий из очереди.
+    cache.bump_versions(cache.post_scope(comment.post_id))
+    # Вне транзакции on_commit срабатывает сразу, а в тестах поток
+    # не запускается и не мешает им своим соединением с базой.
+    transaction.on_commit(start_worker)
+
+
+def pending_for(user, post_id):
+    """Комментарии пользователя к посту, ещё не записанные в базу."""
+    if not enabled() or not user.is_authenticated:
+        return []
+    rows = spool().execute(
+        'SELECT text, created FROM comments '
+        'WHERE post_id = ? AND author_id = ? ORDER BY id',
+        [post_id, user.id],
+    )
+    return [
+        Comment(post_id=post_id, author=user, text=text,
+                created=submitted(created))
+        for text, created in rows
+    ]
+
+
+def submitted(timestamp):
+    """Время отправки комментария; у строк прежнего формата его нет."""
+    if timestamp is None:
+        return django_timezone.now()
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def save(rows):
+    """
+    Пишет строки очереди в базу, пропуская удалённые посты и авторов,
+    а также строки, уже записанные прошлой попыткой.
+    """
+    posts = set(Post.objects.filter(
+        pk__in={row[1] for row in rows}
+    ).values_list('pk', flat=True))
+    authors = set(User.objects.filter(
+        pk__in={row[2] for row in rows}
+    ).values_list('pk', flat=True))
+    # Строкам прежнего формата ключ выдаётся здесь.
+    comments = [
+        Comment(post_id=post_id, author_id=author_id, text=text,
+                queue_key=key or uuid.uuid4().hex, created=submitted(created))
+        for _, post_id, author_id, text, key, created in rows
+        if post_id in posts and author_id in authors
+    ]
+    with transaction.atomic():
+        saved = set(Comment.objects.filter(
+            queue_key__in=[comment.queue_key for comment in comments]
+        ).values_list('queue_key', flat=True))
+        comments = [
+            comment for comment in comments if comment.queue_key not in saved
+        ]
+        if not comments:
+            return
+        # Вставка raw: время отправки не затирается auto_now_add.
+        bulk_insert_raw(comments, ignore_conflicts=True)
+        # id вставка не возвращает: их находим по ключам.
+        ids = dict(Comment.objects.filter(
+            queue_key__in=[comment.queue_key for comment in comments]
+        ).values_list('queue_key', 'pk'))
+        for comment in comments:
+            comment.pk = ids[comment.queue_key]
+        # Счётчик пересчитывается, а не сдвигается: пачку, которую
+        # одновременно записали два процесса, он не посчитает дважды.
+        counts = {comment.post_id for comment in comments}
+        Post.objects.filter(pk__in=counts).update(
+            comment_count=count_related(Comment.objects, 'post')
+        )
+        if search.enabled():
+            search.index_comments(comments)
+    cache.bump_versions(cache.FEED, *map(cache.post_scope, counts))
+
+
+def flush(batch_size=COMMENT_BATCH_SIZE):
+    """
+    Переносит из очереди в базу до batch_size комментариев.
+    Возвращает, сколько строк очереди разобрано.
+    """
+    queue = spool()
+    # Пачка только читается: блокировку записи очереди не держим, пока
+    # пишется общая база, и новые комментарии не ждут её.
+    rows = queue.execute(
+        'SELECT id, post_id, author_id, text, key, created '
+        'FROM comments '
+        'ORDER BY id LIMIT ?',
+        [batch_size],
+    ).fetchall()
+    if rows:
+        # Если пачку одновременно заберёт другой процесс, queue_key
+        # не даст записать её дважды.
+        save(rows)
+        queue.executemany(
+            'DELETE FROM comments WHERE id = ?', [row[:1] for row in rows]
+        )
+    return len(rows)
+
+
+def work():
+    while True:
+        time.sleep(COMMENT_FLUSH_INTERVAL)
+        try:
+            while flush() == COMMENT_BATCH_SIZE:
+                pass
+        except Exception:
+            logger.exception('Не удалось записать комментарии из очереди')
+        finally:
+            # Соединения потока сами не закрываются.
+            connections.close_all()
+
+
+def start_worker():
+    """Запускает поток записи, если в этом процессе его ещё нет."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            # Поток-демон не держит процесс при выходе: недописанное
+            # остаётся в файле очереди до следующего запуска.
+            _worker = threading.Thread(
+                target=work, name='comment-queue', daemon=True
+            )
+            _worker.start()
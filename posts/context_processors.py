@@ -0,0 +1,8 @@
+from posts.settings import FEED_CACHE_TTL, POST_CACHE_TTL
+
+
+def cache_timeouts(request):
+    return {
+        'feed_cache_ttl': FEED_CACHE_TTL,
+        'post_cache_ttl': POST_CACHE_TTL,
+    }
@@ -1,6 +1,9 @@
 from django import forms
+from django.utils import timezone
 
+from . import uploads
 from .models import Comment, Post
+from .settings import IMAGE_MAX_PIXELS, IMAGE_UPLOAD_MAX_BYTES
 
 
 class PostForm(forms.ModelForm):
@@ -13,6 +16,47 @@ class PostForm(forms.ModelForm):
             'image': ('Картинка'),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Обрезанный CappedUploadHandler файл не отдаём ImageField:
+        # он бы сообщил о битой картинке, а не о размере.
+        self.oversized = {
+            name for name, file in self.files.items()
+            if getattr(file, 'oversized', False)
+        }
+        if self.oversized:
+            self.files = self.files.copy()
+            for name in self.oversized:
+                del self.files[name]
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if 'image' in self.oversized:
+            raise forms.ValidationError(
+                'Картинка больше %d МБ' % (IMAGE_UPLOAD_MAX_BYTES // 2 ** 20)
+            )
+        # ImageField прочитал только заголовок: размеры известны без
+        # декодирования, и огромную картинку можно отбросить сразу.
+        header = getattr(image, 'image', None)
+        if header is not None and \
+                header.width * header.height > IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                'Слишком большое разрешение картинки'
+            )
+        return image
+
+    def save(self, commit=True):
+        new_image = 'image' in self.changed_data and self.instance.image
+        self.instance.image_ready = not new_image
+        if new_image:
+            self.instance.image_digest = ''
+            self.instance.image_failed = False
+            self.instance.image_queued_at = timezone.now()
+        post = super().save(commit)
+        if commit and new_image:
+            uploads.schedule(post)
+        return post
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,46 @@
+"""
+Чистые функции над байтами картинок, без Django: их запускают
+в отдельных процессах пула (posts.variants), куда передаются
+только байты и настройки.
+"""
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+SAVE_OPTIONS = {
+    'webp': {'method': 4},
+    'jpeg': {'optimize': True, 'progressive': True},
+}
+
+
+def crop_to_ratio(image, ratio):
+    """Центральный кадр с соотношением сторон ratio (ширина / высота)."""
+    width, height = image.size
+    if width / height > ratio:
+        size = (round(height * ratio), height)
+    else:
+        size = (width, round(width / ratio))
+    return ImageOps.fit(image, size, Image.LANCZOS)
+
+
+def render_variants(data, widths, formats, ratio, quality):
+    """
+    Нарезает картинку по ширинам widths в каждом из форматов formats.
+    Ширины больше исходной пропускаются, но самая узкая есть всегда.
+    Возвращает список (ширина, высота, формат, байты).
+    """
+    with Image.open(BytesIO(data)) as source:
+        frame = crop_to_ratio(source.convert('RGB'), ratio)
+    fitting = [width for width in widths if width <= frame.width]
+    variants = []
+    for width in fitting or [min(widths)]:
+        height = max(1, round(width / ratio))
+        resized = frame.resize((width, height), Image.LANCZOS)
+        for image_format in formats:
+            buffer = BytesIO()
+            resized.save(
+                buffer, image_format.upper(), quality=quality,
+                **SAVE_OPTIONS.get(image_format, {}),
+            )
+            variants.append((width, height, image_format, buffer.getvalue()))
+    return variants
@@ -0,0 +1,116 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from posts import benchmark
+
+DATASET = ('users', 'groups', 'posts', 'comments', 'follows')
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку, число запросов и размер страниц на отдельной '
+        'тестовой базе и сравнивает с эталоном'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--groups', type=int, default=5)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--follows', type=int, default=500)
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Не очищать кэш между запросами',
+        )
+        parser.add_argument(
+            '--baseline',
+            default=os.path.join(
+                settings.BASE_DIR, 'benchmarks', 'baseline.json'
+            ),
+        )
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Записать результат как новый эталон',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимый рост p95, доля от эталона',
+        )
+
+    def handle(self, *args, **options):
+        config = {name: options[name] for name in DATASET}
+        config.update(iterations=options['iterations'], warm=options['warm'])
+        results = self.measure(config)
+        self.report(results)
+        path = options['baseline']
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            benchmark.save_baseline(
+                {'config': config, 'results': results}, path
+            )
+            self.stdout.write(self.style.SUCCESS(f'Эталон записан: {path}'))
+            return
+        # Замер без сравнения ничего не проверяет: молча проходить
+        # его нельзя, иначе регрессия пройдёт незамеченной.
+        if not os.path.exists(path):
+            raise CommandError(
+                f'Эталона {path} нет: снимите его на этой машине '
+                'с --save-baseline'
+            )
+        baseline = benchmark.load_baseline(path)
+        if baseline['config'] != config:
+            raise CommandError(
+                'Эталон снят с другими параметрами: '
+                f'{baseline["config"]}'
+            )
+        regressions = benchmark.compare(
+            results, baseline['results'], options['tolerance']
+        )
+        if regressions:
+            raise CommandError('Регрессии:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def measure(self, config):
+        # Своя база и свой кэш: замер не трогает рабочие данные. Тестовая
+        # база создаётся только для default, поэтому реплики и очередь
+        # комментариев отключены - все запросы идут в неё.
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        try:
+            with override_settings(
+                CACHES=BENCHMARK_CACHES, DATABASE_REPLICAS=[],
+                COMMENT_QUEUE=False,
+            ):
+                benchmark.seed(
+                    stdout=self.stdout,
+                    **{name: config[name] for name in DATASET},
+                )
+                return benchmark.run(config['iterations'], config['warm'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"сценарий":<14}{"p50, мс":>10}{"p95, мс":>10}'
+            f'{"запросов":>10}{"байт":>10}'
+        )
+        for name, row in results.items():
+            self.stdout.write(
+                f'{name:<14}{row["p50_ms"]:>10}{row["p95_ms"]:>10}'
+                f'{row["queries"]:>10}{row["bytes"]:>10}'
+            )
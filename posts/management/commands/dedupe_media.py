@@ -0,0 +1,75 @@
+import os
+import re
+
+from django.core.management.base import BaseCommand
+
+from posts import cache
+from posts.models import Post
+
+HASHED = re.compile(r'^posts/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def walk(storage, directory):
+    """Имена всех файлов каталога хранилища, с подкаталогами."""
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield f'{directory}/{name}'
+    for name in directories:
+        yield from walk(storage, f'{directory}/{name}')
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки media/posts/ под хэш содержимого '
+            'и сливает одинаковые файлы')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не меняя',
+        )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        dry_run = options['dry_run']
+        moved = merged = 0
+        planned = set()
+        # Список снимается заранее: перенос добавляет в каталог файлы.
+        names = [
+            name for name in walk(storage, 'posts')
+            if not HASHED.match(name)
+        ] if storage.exists('posts') else []
+        for name in names:
+            with storage.open(name) as content:
+                target = storage.hashed_name(
+                    f'posts/{os.path.basename(name)}', content
+                )
+            duplicate = target in planned or storage.exists(target)
+            if duplicate:
+                merged += 1
+            else:
+                moved += 1
+            if dry_run:
+                # Без переноса дубль среди ещё не перенесённых
+                # файлов виден только по уже посчитанным хэшам.
+                planned.add(target)
+                continue
+            if not duplicate:
+                # Жёсткая ссылка вместо переноса: пока посты не
+                # переключены на новое имя, старое тоже читается.
+                os.makedirs(
+                    os.path.dirname(storage.path(target)), exist_ok=True
+                )
+                os.link(storage.path(name), storage.path(target))
+            posts = list(
+                Post.objects.filter(image=name).values_list('pk', flat=True)
+            )
+            Post.objects.filter(pk__in=posts).update(image=target)
+            storage.delete(name)
+            if posts:
+                cache.bump_versions(
+                    cache.FEED, *(cache.post_scope(pk) for pk in posts)
+                )
+        prefix = 'Найдено' if dry_run else 'Готово'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}: перенесено файлов {moved}, слито дублей {merged}'
+        ))
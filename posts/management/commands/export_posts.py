@@ -0,0 +1,57 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты, комментарии и подписки в JSON Lines или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для выгрузки, по умолчанию stdout',
+        )
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='По умолчанию по расширению файла, иначе jsonl',
+        )
+        parser.add_argument(
+            '--models', default=','.join(transfer.MODELS),
+            help='Через запятую: post, comment, follow',
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        models = options['models'].split(',')
+        unknown = set(models) - set(transfer.MODELS)
+        if unknown:
+            raise CommandError(f'Неизвестные модели: {", ".join(unknown)}')
+        if file_format == 'csv' and len(models) != 1:
+            raise CommandError('В CSV выгружается одна модель: --models')
+        stream = (
+            sys.stdout if path == '-'
+            else open(path, 'w', encoding='utf-8', newline='')
+        )
+        started = time.monotonic()
+        total = 0
+        try:
+            for model in models:
+                total += transfer.WRITERS[file_format](
+                    transfer.export_rows(model, options['batch_size']),
+                    stream, model,
+                )
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        elapsed = time.monotonic() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено строк: {total} за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts import comment_queue
+from posts.settings import COMMENT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Записывает в базу комментарии из очереди, например '
+            'оставшиеся после остановки сайта')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=COMMENT_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        flushed = 0
+        while True:
+            rows = comment_queue.flush(options['batch_size'])
+            flushed += rows
+            if rows < options['batch_size']:
+                break
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано из очереди: {flushed}'
+        ))
@@ -0,0 +1,135 @@
+import os
+import time
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.bloom import BloomFilter
+from posts.models import ImageVariant, Post
+from posts.settings import THUMBNAIL_SIZES
+
+
+def scan(storage, directory, older_than):
+    """
+    Имена файлов каталога хранилища, изменённых раньше older_than.
+    Каталоги читаются потоком, список всех файлов в память не попадает.
+    """
+    try:
+        entries = os.scandir(storage.path(directory))
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            name = f'{directory}/{entry.name}'
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan(storage, name, older_than)
+            elif entry.stat(follow_symlinks=False).st_mtime < older_than:
+                yield name
+
+
+def column(queryset, field):
+    for name in queryset.values_list(field, flat=True).order_by().iterator():
+        if name:
+            yield name
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки, варианты и миниатюры, на которые '
+            'больше ничего не ссылается')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не удаляя',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Файлы моложе стольких секунд не трогать: '
+                 'их пост может быть ещё не сохранён. Повторная '
+                 'загрузка картинки освежает возраст файла',
+        )
+        parser.add_argument(
+            '--error-rate', type=float, default=0.01,
+            help='Доля ложных срабатываний фильтра Блума: '
+                 'столько сирот переживёт запуск',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        older_than = time.time() - options['min_age']
+        storage = Post._meta.get_field('image').storage
+        images = Post.objects.all()
+        areas = (
+            (
+                'posts', storage, images.count(),
+                lambda: column(images, 'image'),
+                lambda batch: images.filter(image__in=batch).values_list(
+                    'image', flat=True
+                ),
+            ),
+            (
+                'variants', default_storage, ImageVariant.objects.count(),
+                lambda: column(ImageVariant.objects, 'file'),
+                lambda batch: ImageVariant.objects.filter(
+                    file__in=batch
+                ).values_list('file', flat=True),
+            ),
+            (
+                thumbnail_settings.THUMBNAIL_PREFIX.strip('/'),
+                default.storage, images.count() * len(THUMBNAIL_SIZES),
+                lambda: self.thumbnail_names(storage, images),
+                # Миниатюры в БД не записаны, перепроверять их не по чему.
+                lambda batch: (),
+            ),
+        )
+        for directory, area_storage, count, live, referenced in areas:
+            found, deleted = self.collect(
+                directory, area_storage, older_than,
+                BloomFilter(count, options['error_rate']), live, referenced,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'{directory}/: сирот {found}, удалено {deleted}'
+            ))
+
+    def thumbnail_names(self, storage, images):
+        """Имена миниатюр всех картинок постов, без чтения файлов."""
+        for name in column(images, 'image'):
+            source = ImageFile(name, storage)
+            for geometry, options in THUMBNAIL_SIZES:
+                yield thumbnails.thumbnail_name(source, geometry, **options)
+
+    def collect(self, directory, storage, older_than, bloom, live,
+                referenced):
+        for name in live():
+            bloom.add(name)
+        # Фильтр не ошибается в одну сторону: имени, которого
+        # в нём нет, нет и в базе. Остальное переживёт этот запуск.
+        orphans = (
+            name for name in scan(storage, directory, older_than)
+            if name not in bloom
+        )
+        found = deleted = 0
+        batch_size = self.options['batch_size']
+        for batch in iter(lambda: list(islice(orphans, batch_size)), []):
+            # Пока шёл обход, на файл мог сослаться новый пост.
+            batch = set(batch) - set(referenced(batch))
+            found += len(batch)
+            if self.options['dry_run'] or not batch:
+                continue
+            for name in batch:
+                # Хранилище постов перед удалением ещё раз проверяет
+                # ссылки на файл (ContentAddressedStorage.delete).
+                storage.delete(name)
+                # Запись sorl о файле, чтобы {% thumbnail %} не ссылался
+                # на удалённую миниатюру, а сделал её заново.
+                default.kvstore.delete(
+                    ImageFile(name, storage), delete_thumbnails=False
+                )
+            deleted += len(batch)
+        return found, deleted
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts import batches, variants
+from posts.models import Post
+from posts.settings import IMAGE_VARIANT_PROCESSES
+
+
+class Command(BaseCommand):
+    help = 'Нарезает варианты под srcset для картинок существующих постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=max(IMAGE_VARIANT_PROCESSES, 1),
+            help='Сколько картинок нарезать одновременно; '
+                 '1 - без пула потоков, в текущем потоке',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').filter(
+            image_ready=True, image_digest='',
+        ).only('image').order_by('pk').iterator(
+            chunk_size=options['batch_size']
+        )
+        # Нарезка идёт в пуле процессов variants, потоки здесь
+        # только держат его занятым, пока другие читают файлы.
+        done = batches.run(
+            variants.generate, posts,
+            options['workers'], options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {done}'
+        ))
@@ -0,0 +1,75 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии и подписки из JSON Lines или CSV '
+        'пачками bulk_create'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для загрузки, по умолчанию stdin',
+        )
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='По умолчанию по расширению файла, иначе jsonl',
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс',
+        )
+
+    def handle(self, *args, **options):
+        if transfer.has_data():
+            raise CommandError(
+                'В базе уже есть посты, комментарии или подписки: '
+                'импорт сохраняет id из файла и грузится только в пустую базу'
+            )
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        stream = (
+            sys.stdin if path == '-'
+            else open(path, encoding='utf-8', newline='')
+        )
+        self.verbosity = options['verbosity']
+        self.started = time.monotonic()
+        importer = transfer.Importer(options['batch_size'], self.progress)
+        try:
+            for row in transfer.READERS[file_format](stream):
+                importer.add(row)
+            importer.flush()
+            transfer.reset_sequences()
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        total = sum(importer.counts.values())
+        elapsed = time.monotonic() - self.started
+        counts = ', '.join(
+            f'{model}: {count}' for model, count in importer.counts.items()
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено строк: {total} ({counts}) за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
+        if importer.skipped['comment']:
+            self.stdout.write(self.style.WARNING(
+                'Пропущено комментариев к постам не из файла: '
+                f'{importer.skipped["comment"]}'
+            ))
+        if not options['skip_rebuild']:
+            transfer.rebuild(self.stdout)
+
+    def progress(self, model, count):
+        if self.verbosity > 1:
+            elapsed = time.monotonic() - self.started
+            self.stdout.write(f'{model}: +{count} ({elapsed:.1f} с)')
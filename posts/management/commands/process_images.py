@@ -0,0 +1,50 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from posts import uploads
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Обрабатывает картинки, которые фоновый пул потерял при '
+        'перезапуске или не смог обработать'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=10 * 60,
+            help='Картинки в очереди меньше стольких секунд не трогать: '
+                 'их ещё обрабатывает пул',
+        )
+        parser.add_argument(
+            '--failed', action='store_true',
+            help='Повторить и картинки, которые не удалось обработать',
+        )
+
+    def handle(self, *args, **options):
+        queued_before = timezone.now() - datetime.timedelta(
+            seconds=options['min_age']
+        )
+        posts = Post.objects.exclude(image='').filter(
+            Q(image_queued_at__lt=queued_before)
+            | Q(image_queued_at__isnull=True),
+            image_ready=False,
+        )
+        if not options['failed']:
+            posts = posts.filter(image_failed=False)
+        done = failed = 0
+        for post_id in list(posts.order_by('pk').values_list('pk', flat=True)):
+            try:
+                uploads.run(post_id)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'Пост {post_id}: {error}')
+            else:
+                done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {done}, с ошибкой: {failed}'
+        ))
@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.cache import FEED, bump_versions, post_scope, profile_scope
+from posts.models import Comment, Post, ProfileStats, User, count_related
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики комментариев и профилей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        posts = self.recount_posts(batch_size)
+        users = ProfileStats.annotate(User.objects.order_by('pk')).values(
+            'pk', 'username', *ProfileStats.FIELDS
+        )
+        batch, usernames = [], []
+        profiles = 0
+        for row in users.iterator(chunk_size=batch_size):
+            usernames.append(row.pop('username'))
+            batch.append(ProfileStats(user_id=row.pop('pk'), **row))
+            if len(batch) >= batch_size:
+                profiles += self.save(batch, usernames)
+                batch, usernames = [], []
+        profiles += self.save(batch, usernames)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано постов: {posts}, профилей: {profiles}'
+        ))
+
+    def recount_posts(self, batch_size):
+        """comment_count пачками: база не держит блокировку на всю таблицу."""
+        posts, last = 0, 0
+        while True:
+            batch = list(Post.objects.filter(pk__gt=last).order_by(
+                'pk'
+            ).values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                posts += Post.objects.filter(pk__in=batch).update(
+                    comment_count=count_related(Comment.objects, 'post')
+                )
+            bump_versions(*map(post_scope, batch))
+            last = batch[-1]
+        # Карточки в лентах и их ETag держат прежние счётчики.
+        bump_versions(FEED)
+        return posts
+
+    def save(self, batch, usernames):
+        with transaction.atomic():
+            existing = set(ProfileStats.objects.filter(
+                user__in=[stats.user_id for stats in batch]
+            ).values_list('user_id', flat=True))
+            ProfileStats.objects.bulk_create(
+                stats for stats in batch if stats.user_id not in existing
+            )
+            ProfileStats.objects.bulk_update(
+                [stats for stats in batch if stats.user_id in existing],
+                ProfileStats.FIELDS,
+            )
+        cache.delete_many(
+            [ProfileStats.cache_key(stats.user_id) for stats in batch]
+        )
+        bump_versions(*map(profile_scope, usernames))
+        return len(batch)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts import timeline
+from posts.cache import bump_versions, timeline_scope
+from posts.models import TimelineEntry
+from posts.settings import TIMELINE_MAX_ENTRIES
+
+
+class Command(BaseCommand):
+    help = (
+        f'Оставляет в каждой ленте подписок {TIMELINE_MAX_ENTRIES} '
+        'последних записей'
+    )
+
+    def handle(self, *args, **options):
+        users = TimelineEntry.objects.values('user_id').annotate(
+            total=Count('id')
+        ).filter(total__gt=TIMELINE_MAX_ENTRIES).order_by().values_list(
+            'user_id', flat=True
+        )
+        trimmed = deleted = 0
+        for user_id in list(users):
+            with transaction.atomic():
+                deleted += timeline.trim(user_id)
+                bump_versions(timeline_scope(user_id))
+            trimmed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обрезано лент: {trimmed}, удалено записей: {deleted}'
+        ))
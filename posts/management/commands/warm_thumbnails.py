@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts import batches, thumbnails
+from posts.models import Post
+from posts.settings import THUMBNAIL_WORKERS
+
+
+class Command(BaseCommand):
+    help = 'Заранее готовит миниатюры картинок существующих постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=THUMBNAIL_WORKERS,
+            help='Число потоков; 1 - без пула, в текущем потоке',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').filter(image_ready=True)
+        images = (
+            post.image for post in posts.only('image').order_by(
+                'pk'
+            ).iterator(chunk_size=options['batch_size'])
+        )
+        warmed = batches.run(
+            thumbnails.warm, images,
+            options['workers'], options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Подготовлено картинок: {warmed}'
+        ))
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+TABLES = {
+    'posts_post_fts': ('posts_post', 'text', ('text',)),
+    'posts_comment_fts': (
+        'posts_comment', 'text, post_id UNINDEXED', ('text', 'post_id')
+    ),
+}
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, (source, columns, fields) in TABLES.items():
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5('
+            f'{columns}, tokenize="unicode61 remove_diacritics 2")'
+        )
+        fields = ', '.join(fields)
+        schema_editor.execute(
+            f'INSERT INTO {table}(rowid, {fields}) '
+            f'SELECT id, {fields} FROM {source}'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in TABLES:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.9 on 2026-10-18 17:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_comment_thread'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_ready',
+            field=models.BooleanField(default=True, editable=False, verbose_name='картинка обработана'),
+        ),
+    ]
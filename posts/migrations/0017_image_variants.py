@@ -0,0 +1,39 @@
+# Generated by Django 2.2.9 on 2026-10-18 17:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_image_ready'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageVariant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, verbose_name='хэш картинки')),
+                ('width', models.PositiveIntegerField(verbose_name='ширина')),
+                ('height', models.PositiveIntegerField(verbose_name='высота')),
+                ('format', models.CharField(max_length=4, verbose_name='формат')),
+                ('file', models.FileField(upload_to='variants/', verbose_name='файл')),
+                ('size', models.PositiveIntegerField(verbose_name='размер, байт')),
+            ],
+            options={
+                'verbose_name': 'вариант картинки',
+                'verbose_name_plural': 'Варианты картинок',
+                'ordering': ('digest', 'format', 'width'),
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_digest',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='хэш картинки'),
+        ),
+        migrations.AddConstraint(
+            model_name='imagevariant',
+            constraint=models.UniqueConstraint(fields=('digest', 'format', 'width'), name='unique_image_variant'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.9 on 2026-10-18 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='queue_key',
+            field=models.CharField(editable=False, max_length=32, null=True, unique=True),
+        ),
+    ]
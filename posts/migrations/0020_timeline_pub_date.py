@@ -0,0 +1,58 @@
+# Generated by Django 2.2.9 on 2026-10-18 18:35
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+from posts.settings import TIMELINE_FANOUT_LIMIT
+
+
+def copy_pub_dates(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    TimelineEntry.objects.update(pub_date=Subquery(
+        Post.objects.filter(pk=OuterRef('post_id')).values('pub_date')
+    ))
+
+
+def mark_pulled(apps, schema_editor):
+    # Раньше посты популярных авторов не раздавались вовсе: такими
+    # считаются посты авторов, популярных сейчас.
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.filter(
+        author__stats__followers_count__gte=TIMELINE_FANOUT_LIMIT
+    ).update(pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_comment_queue_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timelineentry',
+            name='pub_date',
+            field=models.DateTimeField(null=True, verbose_name='дата публикации поста'),
+        ),
+        migrations.RunPython(copy_pub_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='timelineentry',
+            name='pub_date',
+            field=models.DateTimeField(verbose_name='дата публикации поста'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='pulled',
+            field=models.BooleanField(default=False, editable=False, verbose_name='не разослан по лентам'),
+        ),
+        migrations.RunPython(mark_pulled, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'pulled', '-pub_date', '-id'], name='post_author_pulled_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.9 on 2026-10-18 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_timeline_pub_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_failed',
+            field=models.BooleanField(default=False, editable=False, verbose_name='картинку не удалось обработать'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_queued_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='картинка в очереди с'),
+        ),
+    ]
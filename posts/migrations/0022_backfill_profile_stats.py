@@ -0,0 +1,51 @@
+# Generated by Django 2.2.9 on 2026-10-18 19:10
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def create_stats(apps, schema_editor):
+    # Пользователи, заведённые до 0009, строки счётчиков не получили:
+    # без неё первая подписка или пост считали её целиком.
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    ProfileStats = apps.get_model('posts', 'ProfileStats')
+    users = User.objects.filter(stats__isnull=True).order_by('pk').annotate(
+        followers_count=count(Follow.objects, 'author'),
+        following_count=count(Follow.objects, 'user'),
+        posts_count=count(Post.objects, 'author'),
+    ).values('pk', 'followers_count', 'following_count', 'posts_count')
+    last = 0
+    while True:
+        batch = list(users.filter(pk__gt=last)[:BATCH_SIZE])
+        if not batch:
+            break
+        last = batch[-1]['pk']
+        ProfileStats.objects.bulk_create(
+            [ProfileStats(user_id=row.pop('pk'), **row) for row in batch],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_image_failed'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_stats, migrations.RunPython.noop),
+    ]
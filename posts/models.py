@@ -1,9 +1,64 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connections, models, router
+from django.db.models import AutoField, Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts import cache
+from posts.settings import PROFILE_CACHE_TTL
+from posts.storage import content_storage
 
 User = get_user_model()
 
 
+def count_related(queryset, field):
+    """Подзапрос COUNT(*) по внешнему ключу field, без JOIN-ов."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def bulk_insert_raw(objs, ignore_conflicts=False):
+    """
+    bulk_create в режиме raw, как loaddata пишет фикстуры: значения
+    берутся из объектов как есть, и auto_now_add не затирает перенесённые
+    даты. Сигналов нет, id объектам без него не проставляются.
+    """
+    if not objs:
+        return
+    model = objs[0]._meta.model
+    using = router.db_for_write(model)
+    ops = connections[using].ops
+    fields = model._meta.concrete_fields
+    groups = (
+        ([obj for obj in objs if obj.pk is not None], fields),
+        ([obj for obj in objs if obj.pk is None],
+         [field for field in fields if not isinstance(field, AutoField)]),
+    )
+    for group, group_fields in groups:
+        size = max(ops.bulk_batch_size(group_fields, group), 1)
+        for start in range(0, len(group), size):
+            model._base_manager._insert(
+                group[start:start + size], fields=group_fields, raw=True,
+                using=using, ignore_conflicts=ignore_conflicts,
+            )
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Всё, что нужно post_item.html, одним запросом."""
+        return self.select_related('author', 'group')
+
+
+class CommentManager(models.Manager):
+    # Менеджер, а не свой QuerySet: шаблоны и тесты ждут
+    # в контексте поста обычный QuerySet комментариев.
+    def for_thread(self):
+        """Комментарии в порядке ветки, с авторами, одним запросом."""
+        return self.select_related('author').order_by('created', 'id')
+
+
 class Post(models.Model):
     text = models.TextField('текст', help_text='Здесь Ваш текст')
     pub_date = models.DateTimeField(
@@ -21,15 +76,55 @@ class Post(models.Model):
         help_text='Можете выбрать группу'
     )
     image = models.ImageField(
-        upload_to='posts/',
+        upload_to='posts/', storage=content_storage, db_index=True,
         blank=True, null=True,
         help_text='Можете загрузить картинку'
     )
+    # Загруженную картинку ещё обрабатывает фоновый пул (posts.uploads).
+    image_ready = models.BooleanField(
+        'картинка обработана', default=True, editable=False
+    )
+    # Когда картинку отдали пулу: зависшие дольше порога подбирает
+    # команда process_images.
+    image_queued_at = models.DateTimeField(
+        'картинка в очереди с', null=True, editable=False
+    )
+    image_failed = models.BooleanField(
+        'картинку не удалось обработать', default=False, editable=False
+    )
+    # sha256 обработанной картинки: по нему ищутся её варианты.
+    image_digest = models.CharField(
+        'хэш картинки', max_length=64, blank=True, editable=False
+    )
+    comment_count = models.PositiveIntegerField(
+        'количество комментариев', default=0, editable=False
+    )
+    # Автор был популярен при публикации, и пост не разослан по лентам:
+    # его подмешивают при чтении (posts.timeline).
+    pulled = models.BooleanField(
+        'не разослан по лентам', default=False, editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name_plural = 'Посты'
         verbose_name = 'пост'
+        indexes = [
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', 'pulled', '-pub_date', '-id'],
+                name='post_author_pulled_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -73,10 +168,24 @@ class Comment(models.Model):
         'дата публикации',
         auto_now_add=True,
     )
+    # Ключ строки очереди (posts.comment_queue): повторная запись
+    # той же пачки не создаёт дублей.
+    queue_key = models.CharField(
+        max_length=32, unique=True, null=True, editable=False
+    )
+
+    objects = CommentManager()
 
     class Meta:
+        ordering = ('created', 'id')
         verbose_name_plural = 'Комменитарии'
         verbose_name = 'комментарий'
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -95,3 +204,153 @@ class Follow(models.Model):
     class Meta:
         verbose_name_plural = 'Подписки'
         verbose_name = 'подписка'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок читателя, записанный при публикации."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='timeline',
+        verbose_name='читатель',
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='timeline_entries',
+        verbose_name='пост',
+    )
+    # Копия Post.pub_date: лента листается по индексу этой таблицы.
+    pub_date = models.DateTimeField('дата публикации поста')
+
+    class Meta:
+        verbose_name_plural = 'Записи лент'
+        verbose_name = 'запись ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+
+
+class ImageVariant(models.Model):
+    """
+    Уменьшенная копия картинки одной ширины и формата. Копии
+    привязаны к хэшу содержимого, поэтому одна и та же картинка
+    в разных постах нарезается один раз.
+    """
+
+    digest = models.CharField('хэш картинки', max_length=64)
+    width = models.PositiveIntegerField('ширина')
+    height = models.PositiveIntegerField('высота')
+    format = models.CharField('формат', max_length=4)
+    file = models.FileField('файл', upload_to='variants/')
+    size = models.PositiveIntegerField('размер, байт')
+
+    class Meta:
+        ordering = ('digest', 'format', 'width')
+        verbose_name_plural = 'Варианты картинок'
+        verbose_name = 'вариант картинки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['digest', 'format', 'width'],
+                name='unique_image_variant',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.digest[:12]} {self.width}w {self.format}'
+
+
+class ProfileStats(models.Model):
+    """Счётчики профиля, которые показываются на каждой странице автора."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='пользователь',
+    )
+    followers_count = models.PositiveIntegerField('подписчиков', default=0)
+    following_count = models.PositiveIntegerField('подписок', default=0)
+    posts_count = models.PositiveIntegerField('записей', default=0)
+
+    class Meta:
+        verbose_name_plural = 'Счётчики профилей'
+        verbose_name = 'счётчики профиля'
+
+    def __str__(self):
+        return str(self.user_id)
+
+    FIELDS = ('followers_count', 'following_count', 'posts_count')
+
+    @staticmethod
+    def annotate(users):
+        """Добавляет к запросу пользователей их счётчики подзапросами."""
+        return users.annotate(
+            followers_count=count_related(Follow.objects, 'author'),
+            following_count=count_related(Follow.objects, 'user'),
+            posts_count=count_related(Post.objects, 'author'),
+        )
+
+    @classmethod
+    def count_for(cls, user):
+        counts = cls.annotate(User.objects.filter(pk=user.pk)).values(
+            *cls.FIELDS
+        ).get()
+        return cls(user=user, **counts)
+
+    @classmethod
+    def get_for(cls, user):
+        try:
+            return cls.objects.get(user=user)
+        except cls.DoesNotExist:
+            return cls.create_for(user)
+
+    @classmethod
+    def create_for(cls, user):
+        stats = cls.count_for(user)
+        # INSERT без точки сохранения: строку, которую успел вставить
+        # параллельный запрос, не трогаем - подсчёт у неё такой же.
+        cls.objects.bulk_create([stats], ignore_conflicts=True)
+        return stats
+
+    @classmethod
+    def cached_for(cls, user):
+        return cache.get_or_set(
+            cls.cache_key(user.pk), lambda: cls.get_for(user),
+            PROFILE_CACHE_TTL, stale_key=f'{cls.cache_key(user.pk)}:stale',
+        )
+
+    @staticmethod
+    def cache_key(user_id):
+        return f'profile_stats:{user_id}'
+
+    @classmethod
+    def change(cls, user, **deltas):
+        """
+        Сдвигает счётчики на deltas. Вызывается внутри транзакции
+        сразу после изменения, которое сдвиг описывает.
+        """
+        updated = cls.objects.filter(user=user).update(**{
+            name: F(name) + delta for name, delta in deltas.items()
+        })
+        if not updated:
+            # Строки ещё нет: считаем её целиком, изменение уже учтено.
+            cls.create_for(user)
+        cache.delete(cls.cache_key(user.pk))
+        cache.bump_versions(cache.profile_scope(user.username))
@@ -0,0 +1,138 @@
+import base64
+import copy
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Q
+
+from posts.settings import POSTS_QUANTITY
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPaginator(Paginator):
+    """
+    Пагинация по ключу (keyset): вместо OFFSET и COUNT(*) следующая
+    страница выбирается условием WHERE по последней показанной записи,
+    поэтому глубокие страницы не медленнее первой.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-id')):
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = self.ordering[0].startswith('-')
+        super().__init__(object_list.order_by(*self.ordering), per_page)
+
+    def encode_cursor(self, direction, obj):
+        position = [
+            self.object_list.model._meta.get_field(name).value_to_string(obj)
+            for name in self.fields
+        ]
+        data = json.dumps([direction, position]).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    def cursor_after(self, obj):
+        """Курсор страницы, которая начинается сразу после obj."""
+        return self.encode_cursor(NEXT, obj)
+
+    def decode_cursor(self, cursor):
+        try:
+            padding = '=' * (-len(cursor) % 4)
+            data = base64.urlsafe_b64decode(cursor + padding)
+            direction, position = json.loads(data.decode())
+            values = [
+                self.object_list.model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, position)
+            ]
+        except (TypeError, ValueError, ValidationError) as error:
+            raise InvalidCursor('Неверный курсор') from error
+        if direction not in (NEXT, PREVIOUS) or None in values \
+                or len(values) != len(self.fields):
+            raise InvalidCursor('Неверный курсор')
+        return direction, values
+
+    def _after(self, values, forward, fields=None):
+        """
+        Условие «после позиции values». fields - те же поля под другими
+        именами, когда курсор прикладывается к другой таблице.
+        """
+        fields = fields or self.fields
+        lookup = 'lt' if forward == self.descending else 'gt'
+        condition = Q()
+        for index, name in enumerate(fields):
+            step = Q(**{f'{name}__{lookup}': values[index]})
+            for prev_name, prev_value in zip(fields, values[:index]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        # Отдельное условие по первому полю превращает OR в диапазон,
+        # который база читает прямо из индекса, без сортировки.
+        return Q(**{f'{fields[0]}__{lookup}e': values[0]}) & condition
+
+    def page(self, cursor=None):
+        if not cursor:
+            return self._build_page(self.rows(), NEXT, first=True)
+        direction, values = self.decode_cursor(cursor)
+        return self._build_page(self.rows(values, direction), direction)
+
+    def rows(self, values=None, direction=NEXT):
+        """До per_page + 1 записей после позиции values, по направлению."""
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(
+                self._after(values, forward=direction == NEXT)
+            )
+        if direction == PREVIOUS:
+            queryset = queryset.reverse()
+        return list(queryset[:self.per_page + 1])
+
+    def get_page(self, cursor=None):
+        try:
+            return self.page(cursor)
+        except InvalidPage:
+            return self.page()
+
+    def _build_page(self, rows, direction, first=False):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+        if not rows:
+            has_next = has_previous = False
+        elif direction == NEXT:
+            has_next, has_previous = has_more, not first
+        else:
+            has_next, has_previous = True, has_more
+        # Номер страницы неизвестен без COUNT(*), поэтому странице
+        # достаётся своё «окно» из соседних страниц: этого хватает
+        # стандартным has_next() и has_previous() у Page.
+        window = copy.copy(self)
+        number = 2 if has_previous else 1
+        window.num_pages = number + 1 if has_next else number
+        page = Page(rows, number, window)
+        page.is_cursor = True
+        page.next_cursor = (
+            self.encode_cursor(NEXT, rows[-1]) if has_next else None
+        )
+        page.previous_cursor = (
+            self.encode_cursor(PREVIOUS, rows[0]) if has_previous else None
+        )
+        return page
+
+
+def paginate(request, queryset):
+    """
+    Старые ссылки вида ?page=N обслуживает обычный Paginator,
+    всё остальное листается курсором ?cursor=.
+    """
+    if 'page' in request.GET:
+        paginator = Paginator(queryset, POSTS_QUANTITY)
+        return paginator.get_page(request.GET.get('page'))
+    paginator = CursorPaginator(queryset, POSTS_QUANTITY)
+    return paginator.get_page(request.GET.get('cursor'))
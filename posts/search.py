@@ -0,0 +1,171 @@
+"""
+Полнотекстовый поиск по постам и комментариям.
+
+На SQLite тексты лежат в виртуальных таблицах FTS5 (rowid - id записи),
+которые сигналы держат в согласии с Post.text и Comment.text. Запрос
+находит посты и по их тексту, и по тексту комментариев и сортирует их
+по bm25. На других СУБД остаётся медленный LIKE, без ранжирования.
+"""
+import re
+
+from django.db import connection, connections, router
+
+from posts.models import Comment, Post
+
+POST_TABLE = 'posts_post_fts'
+COMMENT_TABLE = 'posts_comment_fts'
+# Совпадение в комментарии весит вдвое меньше совпадения в самом посте.
+COMMENT_WEIGHT = 0.5
+
+CREATE_TABLES = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {POST_TABLE} USING fts5('
+    f'text, tokenize="unicode61 remove_diacritics 2")',
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {COMMENT_TABLE} USING fts5('
+    f'text, post_id UNINDEXED, tokenize="unicode61 remove_diacritics 2")',
+)
+DROP_TABLES = (
+    f'DROP TABLE IF EXISTS {POST_TABLE}',
+    f'DROP TABLE IF EXISTS {COMMENT_TABLE}',
+)
+
+WORD = re.compile(r'\w+')
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """
+    Слова запроса как префиксы через AND: "слово"* "другое"*. Кавычки
+    не дают синтаксису FTS5 из пользовательского ввода сломать запрос.
+    """
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query))
+
+
+def index_post(post):
+    if enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {POST_TABLE} WHERE rowid = %s', [post.pk]
+            )
+            cursor.execute(
+                f'INSERT INTO {POST_TABLE}(rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text],
+            )
+
+
+def index_comment(comment):
+    if enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {COMMENT_TABLE} WHERE rowid = %s', [comment.pk]
+            )
+            cursor.execute(
+                f'INSERT INTO {COMMENT_TABLE}(rowid, text, post_id) '
+                f'VALUES (%s, %s, %s)',
+                [comment.pk, comment.text, comment.post_id],
+            )
+
+
+def index_comments(comments):
+    """Новые комментарии из bulk_create, который не шлёт сигналов."""
+    if enabled():
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {COMMENT_TABLE}(rowid, text, post_id) '
+                f'VALUES (%s, %s, %s)',
+                [(comment.pk, comment.text, comment.post_id)
+                 for comment in comments],
+            )
+
+
+def unindex(table, pk):
+    if enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [pk])
+
+
+def rebuild():
+    """Заново заполняет индекс из таблиц постов и комментариев."""
+    with connection.cursor() as cursor:
+        for sql in DROP_TABLES + CREATE_TABLES:
+            cursor.execute(sql)
+        cursor.execute(
+            f'INSERT INTO {POST_TABLE}(rowid, text) '
+            f'SELECT id, text FROM {Post._meta.db_table}'
+        )
+        cursor.execute(
+            f'INSERT INTO {COMMENT_TABLE}(rowid, text, post_id) '
+            f'SELECT id, text, post_id FROM {Comment._meta.db_table}'
+        )
+        cursor.execute(f"INSERT INTO {POST_TABLE}({POST_TABLE}) "
+                       f"VALUES ('optimize')")
+        cursor.execute(f"INSERT INTO {COMMENT_TABLE}({COMMENT_TABLE}) "
+                       f"VALUES ('optimize')")
+
+
+class SearchResults:
+    """
+    Ленивый результат поиска для Paginator: считает и режет выдачу
+    на стороне SQLite, а посты страницы достаёт одним запросом.
+    """
+
+    RANKED = (
+        f'SELECT post_id, MIN(rank) AS rank FROM ('
+        f'SELECT rowid AS post_id, bm25({POST_TABLE}) AS rank '
+        f'FROM {POST_TABLE} WHERE {POST_TABLE} MATCH %s '
+        f'UNION ALL '
+        f'SELECT post_id, bm25({COMMENT_TABLE}) * {COMMENT_WEIGHT} '
+        f'FROM {COMMENT_TABLE} WHERE {COMMENT_TABLE} MATCH %s'
+        f') GROUP BY post_id'
+    )
+
+    def __init__(self, query):
+        self.match = match_expression(query)
+
+    def _fetch(self, sql, params=()):
+        if not self.match:
+            return []
+        # Читаем индекс из той же базы, что и сами посты.
+        with connections[router.db_for_read(Post)].cursor() as cursor:
+            cursor.execute(sql, [self.match, self.match, *params])
+            return cursor.fetchall()
+
+    def count(self):
+        rows = self._fetch(f'SELECT COUNT(*) FROM ({self.RANKED})')
+        return rows[0][0] if rows else 0
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start = item.start or 0
+        ids = [row[0] for row in self._fetch(
+            f'{self.RANKED} ORDER BY rank, post_id DESC LIMIT %s OFFSET %s',
+            [item.stop - start, start],
+        )]
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search_posts(query):
+    if enabled():
+        return SearchResults(query)
+    return Post.objects.for_feed().filter(text__icontains=query)
+
+
+def filter_queryset(queryset, query):
+    """Сужает queryset постов или комментариев до найденных в индексе."""
+    match = match_expression(query)
+    if not enabled():
+        return queryset.filter(text__icontains=query)
+    if not match:
+        return queryset
+    table = POST_TABLE if queryset.model is Post else COMMENT_TABLE
+    return queryset.extra(
+        where=[
+            f'{queryset.model._meta.db_table}.id IN '
+            f'(SELECT rowid FROM {table} WHERE {table} MATCH %s)'
+        ],
+        params=[match],
+    )
@@ -1 +1,30 @@
 POSTS_QUANTITY = 15
+FEED_CACHE_TTL = 60 * 60 * 3
+POST_CACHE_TTL = 60 * 60 * 12
+PROFILE_CACHE_TTL = 60 * 60
+CACHE_LOCK_TIMEOUT = 5
+CACHE_STALE_TTL = 60 * 5
+CACHE_RECOMPUTE_BETA = 1.0
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_BACKFILL = 500
+TIMELINE_BATCH_SIZE = 500
+TIMELINE_MAX_ENTRIES = 1000
+# Размеры должны совпадать с тегами {% thumbnail %} в шаблонах.
+THUMBNAIL_SIZES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+THUMBNAIL_WORKERS = 2
+COMMENTS_QUANTITY = 50
+IMAGE_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40_000_000
+IMAGE_MAX_SIDE = 2560
+IMAGE_JPEG_QUALITY = 85
+IMAGE_WORKERS = 2
+# Ширины вариантов под srcset; соотношение сторон как у ленты 960x339.
+IMAGE_VARIANT_WIDTHS = (320, 640, 960, 1280)
+IMAGE_VARIANT_FORMATS = ('webp', 'jpeg')
+IMAGE_VARIANT_RATIO = 960 / 339
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANT_PROCESSES = 2
+COMMENT_BATCH_SIZE = 500
+COMMENT_FLUSH_INTERVAL = 1.0
@@ -0,0 +1,155 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache, search, timeline
+from .cache import (FEED, GROUPS, bump_versions, group_scope, post_scope,
+                    profile_scope, timeline_scope)
+from .models import Comment, Follow, Group, Post, ProfileStats, User
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    bump_versions(FEED, post_scope(instance.pk))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    bump_versions(FEED, post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    bump_versions(FEED, GROUPS, group_scope(instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_timeline(sender, instance, **kwargs):
+    bump_versions(timeline_scope(instance.user_id))
+
+
+@receiver(pre_save, sender=Post)
+def mark_pulled_post(sender, instance, raw=False, **kwargs):
+    # Решение раздавать пост или подмешивать при чтении принимается
+    # один раз, при публикации, и дальше не меняется.
+    if instance._state.adding and not raw:
+        instance.pulled = timeline.is_pulled(instance.author)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    # По id: удаляемая подписка не догружает пользователя и автора.
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+# Счётчики ведут сигналы, а не представления: посты, комментарии
+# и подписки из админки и ORM сдвигают их так же. bulk_create сигналов
+# не шлёт: очередь комментариев сдвигает счётчик сама, импорт
+# пересчитывает всё командой recount_stats.
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ProfileStats.change(instance.author, posts_count=1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1
+        )
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ProfileStats.change(instance.author, followers_count=1)
+        ProfileStats.change(instance.user, following_count=1)
+
+
+def uncount(instance, field, name):
+    """
+    Сдвигает счётчик name пользователя из поля field на единицу вниз.
+    Строку счётчиков не заводим заново: если удаляют самого
+    пользователя, её уже нет.
+    """
+    user_id = getattr(instance, field.attname)
+    ProfileStats.objects.filter(
+        user_id=user_id, **{f'{name}__gt': 0}
+    ).update(**{name: F(name) - 1})
+    cache.delete(ProfileStats.cache_key(user_id))
+    if field.is_cached(instance):
+        username = getattr(instance, field.name).username
+    else:
+        username = User.objects.filter(pk=user_id).values_list(
+            'username', flat=True
+        ).first()
+    if username is not None:
+        bump_versions(profile_scope(username))
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    uncount(instance, Post._meta.get_field('author'), 'posts_count')
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    uncount(instance, Follow._meta.get_field('author'), 'followers_count')
+    uncount(instance, Follow._meta.get_field('user'), 'following_count')
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    # При каскаде от поста UPDATE уходит в строку, которая удаляется
+    # следом, и ничего не портит.
+    Post.objects.filter(
+        pk=instance.post_id, comment_count__gt=0
+    ).update(comment_count=F('comment_count') - 1)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.unindex(search.POST_TABLE, instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.unindex(search.COMMENT_TABLE, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def create_profile_stats(sender, instance, created, using, raw=False,
+                         **kwargs):
+    # У нового пользователя все счётчики нулевые: строка заводится сразу,
+    # и подписки с постами только сдвигают её, не пересчитывая.
+    # Строка ложится в ту же базу, что и пользователь.
+    if created and not raw:
+        ProfileStats.objects.using(using).create(user=instance)
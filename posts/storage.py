@@ -0,0 +1,60 @@
+"""
+Хранилище картинок постов с адресацией по содержимому.
+
+Файл сохраняется под sha256 своего содержимого:
+posts/ab/<sha256>.jpg. Одинаковая картинка в разных постах лежит
+на диске один раз, а миниатюры sorl и варианты под srcset, которые
+привязаны к имени и хэшу файла, тоже делаются один раз.
+
+Раз файл может быть общим, delete() удаляет его, только когда на него
+не ссылается ни один пост: счётчиком ссылок служит сама колонка
+Post.image (с индексом). Сохранение уже лежащего файла обновляет его
+mtime, чтобы gc_media считал его свежим.
+"""
+import hashlib
+import os
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, content):
+        """Имя файла по содержимому: каталог и расширение — от name."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        try:
+            # Повторная загрузка освежает mtime: gc_media не тронет файл,
+            # пока новый пост на него ещё не сослался (см. --min-age).
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+        saved = super()._save(name, content)
+        if saved != name:
+            # Тот же файл одновременно записал другой запрос,
+            # и FileSystemStorage подобрал копии свободное имя.
+            super().delete(saved)
+        return name
+
+    def is_referenced(self, name):
+        """Ссылается ли на файл хоть один пост."""
+        post = apps.get_model('posts', 'Post')
+        return post.objects.filter(image=name).exists()
+
+    def delete(self, name):
+        if not self.is_referenced(name):
+            super().delete(name)
+
+
+content_storage = ContentAddressedStorage()
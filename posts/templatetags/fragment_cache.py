@@ -0,0 +1,67 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from posts.cache import get_or_set
+
+register = template.Library()
+
+
+class ProtectedCacheNode(template.Node):
+    def __init__(self, nodelist, expire_time_var, fragment_name, vary_on,
+                 stale_var=None):
+        self.nodelist = nodelist
+        self.expire_time_var = expire_time_var
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.stale_var = stale_var
+
+    def render(self, context):
+        try:
+            expire_time = int(self.expire_time_var.resolve(context))
+        except (ValueError, TypeError):
+            raise template.TemplateSyntaxError(
+                '"protected_cache" tag got a non-integer timeout value'
+            )
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        stale_key = None
+        if self.stale_var is not None:
+            stale_key = make_template_fragment_key(
+                self.fragment_name, ['stale', self.stale_var.resolve(context)]
+            )
+        return get_or_set(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context),
+            expire_time,
+            stale_key=stale_key,
+        )
+
+
+@register.tag('protected_cache')
+def do_protected_cache(parser, token):
+    """
+    Как {% cache %}, но защищён от одновременного пересчёта
+    одного и того же фрагмента:
+
+        {% protected_cache [expire_time] [fragment_name] [var1] ..
+                           [stale=var] %}
+
+    stale= задаёт ключ без версий: под ним лежит последняя отрисовка,
+    её отдают, пока фрагмент с новой версией пересчитывается.
+    """
+    nodelist = parser.parse(('endprotected_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    stale_var = None
+    if tokens[-1].startswith('stale='):
+        stale_var = parser.compile_filter(tokens.pop()[len('stale='):])
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            "'%r' tag requires at least 2 arguments." % tokens[0]
+        )
+    return ProtectedCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+        stale_var,
+    )
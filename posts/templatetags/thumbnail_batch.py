@@ -0,0 +1,28 @@
+from django import template
+
+from posts import thumbnails, variants
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, geometry, **options):
+    """
+    Достаёт миниатюры всех постов страницы разом, до их отрисовки:
+
+        {% prefetch_thumbnails page "960x339" crop="center" upscale=True %}
+    """
+    thumbnails.prefetch(posts, geometry, **options)
+    return ''
+
+
+@register.simple_tag
+def prefetch_variants(posts):
+    """
+    Достаёт варианты картинок под srcset для всех постов страницы
+    одним запросом; ставится до prefetch_thumbnails:
+
+        {% prefetch_variants page %}
+    """
+    variants.prefetch(posts)
+    return ''
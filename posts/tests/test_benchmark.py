@@ -0,0 +1,37 @@
+from io import StringIO
+
+from django.test import TestCase
+
+from posts import benchmark
+from posts.models import Comment, Follow, Post
+
+SCENARIOS = (
+    'index', 'group_posts', 'profile', 'post_view', 'follow_index',
+    'add_comment', 'new_post',
+)
+
+
+class BenchmarkTest(TestCase):
+    def test_seed_and_run(self):
+        benchmark.seed(
+            users=5, groups=2, posts=30, comments=20, follows=8,
+            stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 20)
+        self.assertEqual(Follow.objects.count(), 8)
+        results = benchmark.run(iterations=3)
+        self.assertEqual(tuple(results), SCENARIOS)
+        for name, row in results.items():
+            with self.subTest(name=name):
+                self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+                self.assertGreater(row['queries'], 0)
+
+    def test_compare(self):
+        baseline = {
+            'index': {'p50_ms': 5, 'p95_ms': 10, 'queries': 4, 'bytes': 1},
+        }
+        same = {'index': dict(baseline['index'], p95_ms=11)}
+        self.assertEqual(benchmark.compare(same, baseline), [])
+        worse = {'index': dict(baseline['index'], p95_ms=20, queries=5)}
+        self.assertEqual(len(benchmark.compare(worse, baseline)), 2)
@@ -0,0 +1,93 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import TestCase
+
+from posts.cache import get_or_set
+
+
+class GetOrSetTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def producer(self):
+        self.calls += 1
+        return 'value %s' % self.calls
+
+    def test_value_is_cached(self):
+        self.assertEqual(get_or_set('key', self.producer, 60), 'value 1')
+        self.assertEqual(get_or_set('key', self.producer, 60), 'value 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_early_recompute(self):
+        """ Значение пересчитывается заранее, до истечения срока """
+        cache.set('key', ('old', time.time() - 1, 0.1), 60)
+        self.assertEqual(get_or_set('key', self.producer, 60), 'value 1')
+
+    def test_stale_value_while_locked(self):
+        """ Пока другой процесс пересчитывает, отдаётся прежнее значение """
+        cache.set('key', ('old', time.time() - 1, 0.1), 60)
+        cache.add('lock:key', True)
+        self.assertEqual(get_or_set('key', self.producer, 60), 'old')
+        self.assertEqual(self.calls, 0)
+
+    def test_no_wait_without_value(self):
+        """ Без значения не ждём того, кто держит блокировку """
+        cache.add('lock:key', True)
+        with mock.patch('posts.cache.time.sleep', side_effect=AssertionError):
+            self.assertEqual(get_or_set('key', self.producer, 60), 'value 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_key_on_cold_miss(self):
+        """ После сдвига версии, пока один пересчитывает, отдаётся прошлое """
+        get_or_set('key:v1', self.producer, 60, stale_key='key')
+        cache.add('lock:key:v2', True)
+        self.assertEqual(
+            get_or_set('key:v2', self.producer, 60, stale_key='key'),
+            'value 1',
+        )
+        self.assertEqual(self.calls, 1)
+        cache.delete('lock:key:v2')
+        self.assertEqual(
+            get_or_set('key:v2', self.producer, 60, stale_key='key'),
+            'value 2',
+        )
+
+    def test_value_outlives_its_term(self):
+        """ Прежнее значение хранится дольше срока, чтобы его отдавать """
+        with mock.patch('posts.cache.cache.set_many') as set_many:
+            get_or_set('key', self.producer, 60)
+        self.assertGreater(set_many.call_args[0][1], 60)
+
+    def test_protected_cache_tag(self):
+        template = Template(
+            '{% load fragment_cache %}'
+            '{% protected_cache 60 fragment name %}{{ name }}{{ other }}'
+            '{% endprotected_cache %}'
+        )
+        self.assertEqual(template.render(Context({'name': 'a'})), 'a')
+        self.assertEqual(
+            template.render(Context({'name': 'a', 'other': 'b'})), 'a'
+        )
+        self.assertEqual(template.render(Context({'name': 'b'})), 'b')
+
+    def test_protected_cache_tag_stale(self):
+        template = Template(
+            '{% load fragment_cache %}'
+            '{% protected_cache 60 fragment version stale=name %}'
+            '{{ version }}{% endprotected_cache %}'
+        )
+        self.assertEqual(
+            template.render(Context({'name': 'a', 'version': 1})), '1'
+        )
+        with mock.patch('posts.cache.cache.add', return_value=False):
+            self.assertEqual(
+                template.render(Context({'name': 'a', 'version': 2})), '1'
+            )
+            self.assertEqual(
+                template.render(Context({'name': 'b', 'version': 2})), '2'
+            )
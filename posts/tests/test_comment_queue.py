@@ -0,0 +1,185 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import comment_queue, search
+from posts.models import Comment, Post, User
+
+QUEUE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(
+    COMMENT_QUEUE=True,
+    COMMENT_QUEUE_PATH=os.path.join(QUEUE_DIR, 'queue.sqlite3'),
+)
+class CommentQueueTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+        cls.POST = reverse('post', args=[cls.user.username, cls.post.id])
+        cls.ADD_COMMENT = reverse(
+            'add_comment', args=[cls.user.username, cls.post.id]
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(QUEUE_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        comment_queue.spool().execute('DELETE FROM comments')
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def comment(self, text):
+        return self.client.post(self.ADD_COMMENT, {'text': text})
+
+    def test_author_reads_own_queued_comment(self):
+        first = self.client.get(self.POST)
+        response = self.comment('Комментарий из очереди')
+        self.assertRedirects(response, self.POST)
+        self.assertFalse(Comment.objects.exists())
+        self.assertContains(
+            self.client.get(self.POST, HTTP_IF_NONE_MATCH=first['ETag']),
+            'Комментарий из очереди',
+        )
+        self.assertNotContains(
+            self.reader_client.get(self.POST), 'Комментарий из очереди'
+        )
+        self.assertEqual(comment_queue.flush(), 1)
+        self.assertContains(
+            self.reader_client.get(self.POST), 'Комментарий из очереди', 1
+        )
+        self.assertContains(
+            self.client.get(self.POST), 'Комментарий из очереди', 1
+        )
+
+    def test_flush_in_batches(self):
+        for number in range(3):
+            self.comment(f'Комментарий {number}')
+        self.reader_client.post(self.ADD_COMMENT, {'text': 'Ответ борщом'})
+        self.client.post(self.ADD_COMMENT, {'text': ''})
+        self.assertEqual(comment_queue.flush(batch_size=3), 3)
+        self.assertEqual(comment_queue.flush(batch_size=3), 1)
+        self.assertEqual(comment_queue.flush(batch_size=3), 0)
+        self.assertEqual(
+            list(self.post.comments.for_thread().values_list(
+                'author__username', 'text'
+            )),
+            [('TestUser', f'Комментарий {number}') for number in range(3)]
+            + [('Reader', 'Ответ борщом')],
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 4)
+        self.assertEqual(
+            [post.id for post in search.search_posts('борщ')], [self.post.id]
+        )
+
+    def test_comments_of_deleted_posts_are_dropped(self):
+        post = Post.objects.create(text='Будет удалён', author=self.user)
+        self.client.post(
+            reverse('add_comment', args=[self.user.username, post.id]),
+            {'text': 'Пропадёт'},
+        )
+        self.comment('Останется')
+        post.delete()
+        out = StringIO()
+        call_command('flush_comments', stdout=out)
+        self.assertIn('Записано из очереди: 2', out.getvalue())
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)),
+            ['Останется'],
+        )
+
+    def test_flush_after_crash_adds_no_duplicates(self):
+        """Пачку, записанную до падения, повторная запись пропускает."""
+        self.comment('Один раз')
+        rows = comment_queue.spool().execute(
+            'SELECT id, post_id, author_id, text, key, created '
+            'FROM comments'
+        ).fetchall()
+        # Процесс упал после записи в базу, но до чистки очереди.
+        comment_queue.save(rows)
+        self.assertEqual(comment_queue.flush(), 1)
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)),
+            ['Один раз'],
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_queue_is_writable_while_batch_is_saved(self):
+        """Пока пачка пишется в базу, очередь принимает новые строки."""
+        self.comment('Первый')
+        save = comment_queue.save
+
+        def save_and_enqueue(rows):
+            # Другой процесс: соединение без ожидания блокировки.
+            other = sqlite3.connect(
+                settings.COMMENT_QUEUE_PATH, timeout=0
+            )
+            with other:
+                other.execute(
+                    'INSERT INTO comments (post_id, author_id, text) '
+                    'VALUES (?, ?, ?)',
+                    [self.post.id, self.user.id, 'Второй'],
+                )
+            other.close()
+            save(rows)
+
+        with mock.patch.object(comment_queue, 'save', save_and_enqueue):
+            self.assertEqual(comment_queue.flush(), 1)
+        self.assertEqual(Comment.objects.get().text, 'Первый')
+        self.assertEqual(comment_queue.flush(), 1)
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_comment_dated_by_submit_time(self):
+        submitted = datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        with mock.patch.object(
+            comment_queue.time, 'time', return_value=submitted.timestamp()
+        ):
+            self.comment('Из очереди')
+        self.assertEqual(
+            comment_queue.pending_for(self.user, self.post.id)[0].created,
+            submitted,
+        )
+        comment_queue.flush()
+        self.assertEqual(Comment.objects.get().created, submitted)
+
+    def test_old_queue_file_is_upgraded(self):
+        path = os.path.join(QUEUE_DIR, 'old.sqlite3')
+        with sqlite3.connect(path) as old:
+            old.execute(
+                'CREATE TABLE comments (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'post_id INTEGER NOT NULL, author_id INTEGER NOT NULL, '
+                'text TEXT NOT NULL)'
+            )
+            old.execute(
+                'INSERT INTO comments (post_id, author_id, text) '
+                'VALUES (?, ?, ?)',
+                [self.post.id, self.user.id, 'Из старой очереди'],
+            )
+        old.close()
+        with override_settings(COMMENT_QUEUE_PATH=path):
+            self.comment('Из новой очереди')
+            self.assertEqual(comment_queue.flush(), 2)
+        self.assertEqual(
+            list(Comment.objects.order_by('id').values_list(
+                'text', flat=True
+            )),
+            ['Из старой очереди', 'Из новой очереди'],
+        )
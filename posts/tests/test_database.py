@@ -0,0 +1,170 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connections
+from django.db.utils import ConnectionHandler
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, ProfileStats, User
+from yatube.database import STICKY_COOKIE
+
+HEALTH = reverse('health')
+INDEX = reverse('index')
+REPLICA = 'replica_test'
+NEW_TEXT = 'Только что написанный пост'
+
+
+class SQLiteTuningTest(SimpleTestCase):
+    """Файловая база SQLite в WAL: читатель не мешает писателю."""
+    # Соединения свои, но pytest-django пускает к базе только тесты,
+    # которые её объявили.
+    databases = {'default'}
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.handler = ConnectionHandler({
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3', 'NAME': self.path,
+            },
+            'other': {
+                'ENGINE': 'django.db.backends.sqlite3', 'NAME': self.path,
+            },
+        })
+
+    def tearDown(self):
+        self.handler.close_all()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def pragma(self, cursor, name):
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()[0]
+
+    def test_pragmas_on_new_connection(self):
+        with self.handler['default'].cursor() as cursor:
+            self.assertEqual(self.pragma(cursor, 'journal_mode'), 'wal')
+            self.assertEqual(self.pragma(cursor, 'synchronous'), 1)
+            self.assertEqual(self.pragma(cursor, 'busy_timeout'), 5000)
+
+    def test_reader_does_not_block_writer(self):
+        reader = self.handler['default'].cursor()
+        writer = self.handler['other'].cursor()
+        writer.execute('CREATE TABLE note (text TEXT)')
+        writer.execute("INSERT INTO note VALUES ('первая')")
+        reader.execute('BEGIN')
+        reader.execute('SELECT COUNT(*) FROM note')
+        self.assertEqual(reader.fetchone()[0], 1)
+        # В журнале отката этот коммит ждал бы конца чтения.
+        writer.execute('PRAGMA busy_timeout = 0')
+        writer.execute("INSERT INTO note VALUES ('вторая')")
+        reader.execute('SELECT COUNT(*) FROM note')
+        self.assertEqual(reader.fetchone()[0], 1)
+        reader.execute('COMMIT')
+        reader.execute('SELECT COUNT(*) FROM note')
+        self.assertEqual(reader.fetchone()[0], 2)
+
+
+class HealthTest(TestCase):
+    def test_ok(self):
+        response = Client().get(HEALTH)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'ok', 'databases': {}})
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_database_down(self):
+        with mock.patch(
+            'posts.views.check_databases',
+            return_value={'default': 'unable to open database file'},
+        ):
+            response = Client().get(HEALTH)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], 'error')
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTest(TestCase):
+    """
+    Реплика — отдельный файл SQLite с той же схемой, но своими
+    данными: так видно, из какой базы прочитана страница.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        handle, cls.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connections.databases[REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': cls.path,
+        }
+        with override_settings(DATABASE_REPLICAS=[]):
+            call_command('migrate', database=REPLICA, verbosity=0)
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.user.save(using=REPLICA, force_insert=True)
+        Post.objects.create(text='Запись в основной базе', author=cls.user)
+        Post.objects.using(REPLICA).create(
+            text='Запись на реплике', author_id=cls.user.pk
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections.databases[REPLICA]
+        delattr(connections._connections, REPLICA)
+        os.remove(cls.path)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        caches['default'].clear()
+
+    def test_read_only_view_reads_replica(self):
+        response = self.client.get(INDEX)
+        self.assertContains(response, 'Запись на реплике')
+        self.assertNotContains(response, 'Запись в основной базе')
+
+    def test_write_goes_to_primary_and_sticks(self):
+        response = self.client.post(reverse('new_post'), {'text': NEW_TEXT})
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], 10)
+        self.assertTrue(Post.objects.filter(text=NEW_TEXT).exists())
+        self.assertFalse(
+            Post.objects.using(REPLICA).filter(text=NEW_TEXT).exists()
+        )
+        response = self.client.get(INDEX)
+        self.assertContains(response, NEW_TEXT)
+        self.assertNotContains(response, 'Запись на реплике')
+        # Кука истекла — снова читаем реплику.
+        del self.client.cookies[STICKY_COOKIE]
+        caches['default'].clear()
+        self.assertNotContains(self.client.get(INDEX), NEW_TEXT)
+
+    def test_incidental_write_does_not_stick(self):
+        """ Попутная запись GET-страницы не отключает реплику """
+        ProfileStats.objects.using(REPLICA).filter(user=self.user).delete()
+        response = self.client.get(
+            reverse('profile', args=[self.user.username])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_follow_sticks(self):
+        """ Подписка идёт GET-запросом, но закрепляет за основной базой """
+        author = User.objects.create_user(username='TestAuthor')
+        response = self.client.get(
+            reverse('profile_follow', args=[author.username])
+        )
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    def test_views_without_hint_read_primary(self):
+        post = Post.objects.get(text='Запись в основной базе')
+        response = self.client.get(
+            reverse('post_edit', args=[self.user.username, post.pk])
+        )
+        self.assertEqual(response.context['post'], post)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
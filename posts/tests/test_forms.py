@@ -83,6 +83,7 @@ class PostFormTest(TestCase):
             data=form_data,
             follow=True,
         )
+        self.image.seek(0)
         response = self.authorized_client.post(
             NEW_POST,
             data=form_data,
@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.bloom import BloomFilter
+from posts.models import ImageVariant, Post, User
+from posts.settings import THUMBNAIL_SIZES
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class BloomFilterTest(SimpleTestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        names = [f'posts/{number}.jpg' for number in range(1000)]
+        for name in names:
+            bloom.add(name)
+        self.assertTrue(all(name in bloom for name in names))
+        false_positives = sum(
+            f'cache/{number}.jpg' in bloom for number in range(10000)
+        )
+        self.assertLess(false_positives, 300)
+        self.assertLess(len(bloom.bits), 1300)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class GcMediaTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+
+    def tearDown(self):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def put(self, name):
+        """Файл мимо хранилища постов, как его оставила бы правка."""
+        path = os.path.join(MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(SMALL_GIF)
+        return name
+
+    def test_gc_media(self):
+        post = Post.objects.create(
+            text='Тестовый текст', author=self.user,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        variant = default_storage.save(
+            'variants/ab/live-320.webp', ContentFile(SMALL_GIF)
+        )
+        ImageVariant.objects.create(
+            digest='ab' * 32, width=320, height=113, format='webp',
+            file=variant, size=len(SMALL_GIF),
+        )
+        geometry, options = THUMBNAIL_SIZES[0]
+        thumbnail = self.put(
+            thumbnails.thumbnail_name(post.image, geometry, **options)
+        )
+        live = [post.image.name, variant, thumbnail]
+        orphans = [
+            self.put('posts/replaced.jpg'),
+            self.put('posts/cd/' + 'cd' * 32 + '.gif'),
+            self.put('variants/ef/gone-320.webp'),
+            self.put('cache/00/11/gone.jpg'),
+        ]
+        gone = ImageFile(orphans[-1], default.storage)
+        gone.set_size((960, 339))
+        default.kvstore.set(gone)
+        out = StringIO()
+        call_command('gc_media', min_age=3600, stdout=out)
+        call_command('gc_media', min_age=0, dry_run=True, stdout=out)
+        for name in live + orphans:
+            self.assertTrue(default_storage.exists(name), name)
+        self.assertIn('posts/: сирот 0, удалено 0', out.getvalue())
+        self.assertIn('posts/: сирот 2, удалено 0', out.getvalue())
+        out = StringIO()
+        call_command('gc_media', min_age=0, batch_size=1, stdout=out)
+        self.assertEqual(out.getvalue().splitlines(), [
+            'posts/: сирот 2, удалено 2',
+            'variants/: сирот 1, удалено 1',
+            'cache/: сирот 1, удалено 1',
+        ])
+        for name in live:
+            self.assertTrue(default_storage.exists(name), name)
+        for name in orphans:
+            self.assertFalse(default_storage.exists(name), name)
+        self.assertIsNone(default.kvstore.get(gone))
+
+    def test_file_referenced_before_delete_is_kept(self):
+        """Картинку, на которую сослались после перепроверки, не удалить."""
+        orphan = self.put('posts/cd/' + 'cd' * 32 + '.gif')
+        storage = Post._meta.get_field('image').storage
+        with mock.patch.object(
+            type(storage), 'is_referenced', return_value=True
+        ):
+            call_command('gc_media', min_age=0, stdout=StringIO())
+        self.assertTrue(storage.exists(orphan))
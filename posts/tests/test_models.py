@@ -1,3 +1,4 @@
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 
 from posts.models import Comment, Follow, Group, Post, User
@@ -160,3 +161,7 @@ class FollowModelTest(TestCase):
             with self.subTest(value=value):
                 self.assertEqual(
                     Follow._meta.get_field(value).verbose_name, expected)
+
+    def test_follow_is_unique(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.user2)
@@ -0,0 +1,65 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.paginators import CursorPaginator
+from posts.settings import POSTS_QUANTITY
+
+INDEX = reverse('index')
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        Post.objects.bulk_create(
+            Post(text='Тестовый текст %s' % i, author=cls.user)
+            for i in range(POSTS_QUANTITY * 2 + 3)
+        )
+        cls.expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )
+        )
+
+    def test_walk_forward_and_back(self):
+        """Курсор проходит ленту вперёд и назад без пропусков."""
+        paginator = CursorPaginator(Post.objects.all(), POSTS_QUANTITY)
+        page = paginator.get_page()
+        self.assertFalse(page.has_previous())
+        seen = [post.id for post in page]
+        pages = [page]
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            seen += [post.id for post in page]
+            pages.append(page)
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages), 3)
+        back = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(list(back), list(pages[1]))
+        self.assertTrue(back.has_next())
+        first = paginator.get_page(back.previous_cursor)
+        self.assertEqual(list(first), list(pages[0]))
+        self.assertFalse(first.has_previous())
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        paginator = CursorPaginator(Post.objects.all(), POSTS_QUANTITY)
+        page = paginator.get_page('not-a-cursor')
+        self.assertEqual(
+            [post.id for post in page], self.expected[:POSTS_QUANTITY]
+        )
+
+    def test_index_uses_cursor_without_count(self):
+        """Лента листается по ?cursor= без COUNT(*)."""
+        client = Client()
+        response = client.get(INDEX)
+        page = response.context['page']
+        self.assertTrue(page.is_cursor)
+        self.assertContains(response, '?cursor=' + page.next_cursor)
+        self.assertNotIn('count', page.paginator.__dict__)
+        response = client.get(INDEX, {'cursor': page.next_cursor})
+        self.assertEqual(
+            [post.id for post in response.context['page']],
+            self.expected[POSTS_QUANTITY:POSTS_QUANTITY * 2],
+        )
@@ -0,0 +1,111 @@
+import re
+
+from django.core.cache import caches
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import views
+from posts.models import Follow, Post, ProfileStats, User
+from yatube.performance import QueryBudgetExceeded, query_budget
+
+INDEX = reverse('index')
+
+
+class PerformanceMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        user = User.objects.create_user(username='TestUser')
+        Post.objects.create(text='Тестовый текст', author=user)
+
+    def setUp(self):
+        self.client = Client()
+        caches['default'].clear()
+
+    def cache_stats(self, header):
+        return tuple(map(int, re.search(
+            r'cache;desc="(\d+) hits, (\d+) misses"', header
+        ).groups()))
+
+    def test_server_timing(self):
+        cold = self.client.get(INDEX)['Server-Timing']
+        warm = self.client.get(INDEX)['Server-Timing']
+        self.assertRegex(
+            cold, r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", '
+                  r'tpl;dur=[\d.]+, cache;desc='
+        )
+        cold_hits, cold_misses = self.cache_stats(cold)
+        warm_hits, warm_misses = self.cache_stats(warm)
+        self.assertGreater(cold_misses, 0)
+        self.assertGreater(warm_hits, cold_hits)
+        self.assertLess(warm_misses, cold_misses)
+
+    def test_server_timing_is_internal(self):
+        """ Снаружи заголовок видят только сотрудники """
+        remote = {'REMOTE_ADDR': '203.0.113.5'}
+        self.assertNotIn('Server-Timing', self.client.get(INDEX, **remote))
+        staff = User.objects.create_user(username='Staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertIn('Server-Timing', self.client.get(INDEX, **remote))
+        with override_settings(PERFORMANCE_SERVER_TIMING=True):
+            self.assertIn(
+                'Server-Timing', Client().get(INDEX, **remote)
+            )
+
+    def test_log_line(self):
+        with self.assertLogs('yatube.performance', 'INFO') as logs:
+            self.client.get(INDEX)
+        self.assertEqual(len(logs.records), 1)
+        data = logs.records[0].performance
+        self.assertEqual((data['view'], data['status']), ('index', 200))
+        self.assertGreater(data['db_queries'], 0)
+        self.assertIn('view=index status=200', logs.output[0])
+
+    @override_settings(PERFORMANCE_SLOW_REQUEST_MS=0)
+    def test_slow_request_logs_sql(self):
+        with self.assertLogs('yatube.performance', 'WARNING') as logs:
+            self.client.get(INDEX)
+        data = logs.records[0].performance
+        self.assertEqual(len(data['sql']), data['db_queries'])
+        self.assertIn('SELECT', logs.output[0])
+
+
+class QueryBudgetTest(TestCase):
+    def test_view_declares_budget(self):
+        self.assertEqual(views.index.query_budget, 5)
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_raises_over_budget(self):
+        with query_budget(2):
+            list(User.objects.all())
+            list(Post.objects.all())
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'при бюджете 1'):
+            with query_budget(1):
+                list(User.objects.all())
+                list(Post.objects.all())
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_logs_over_budget(self):
+        @query_budget(0)
+        def read():
+            return list(Post.objects.all())
+
+        with self.assertLogs('yatube.performance', 'WARNING') as logs:
+            read()
+        self.assertIn('read: 1 SQL-запросов при бюджете 0', logs.output[0])
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_logs_over_budget_after_write(self):
+        """Записанную подписку превышение не превращает в ответ 500."""
+        user = User.objects.create_user(username='Follower')
+        author = User.objects.create_user(username='Author')
+        ProfileStats.objects.all().delete()
+        client = Client()
+        client.force_login(user)
+        with self.assertLogs('yatube.performance', 'WARNING') as logs:
+            response = client.get(
+                reverse('profile_follow', args=[author.username])
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Follow.objects.filter(user=user, author=author))
+        self.assertIn('profile_follow', logs.output[0])
@@ -0,0 +1,54 @@
+from django.db import connection
+from django.test import TestCase
+
+from posts.models import Group, Post, User
+from posts.paginators import CursorPaginator
+from posts.settings import POSTS_QUANTITY
+
+
+class FeedQueryPlanTest(TestCase):
+    """Ленты группы и автора читаются по индексу, без сортировки в памяти."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(title='test_title', slug='test')
+        Post.objects.bulk_create(
+            Post(text='Тестовый текст', author=cls.user, group=cls.group)
+            for _ in range(POSTS_QUANTITY * 2)
+        )
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return ' | '.join(row[-1] for row in cursor.fetchall())
+
+    def assert_uses_index(self, queryset, index):
+        paginator = CursorPaginator(queryset, POSTS_QUANTITY)
+        cursor = paginator.get_page().next_cursor
+        direction, values = paginator.decode_cursor(cursor)
+        pages = [
+            paginator.object_list,
+            paginator.object_list.filter(paginator._after(values, True)),
+        ]
+        for page in pages:
+            plan = self.query_plan(page[:POSTS_QUANTITY + 1])
+            with self.subTest(plan=plan):
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_group_feed_plan(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN есть только в SQLite')
+        self.assert_uses_index(
+            self.group.posts.for_feed(), 'post_group_pub_date_idx'
+        )
+
+    def test_author_feed_plan(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN есть только в SQLite')
+        self.assert_uses_index(
+            self.user.posts.for_feed(), 'post_author_pub_date_idx'
+        )
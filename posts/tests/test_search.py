@@ -0,0 +1,77 @@
+from io import StringIO
+
+from django.contrib.admin.sites import site
+from django.core.management import call_command
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Post, User
+from posts.settings import POSTS_QUANTITY
+
+SEARCH = reverse('search')
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.in_text = Post.objects.create(
+            text='Рецепт борща со свёклой', author=cls.user
+        )
+        cls.in_comment = Post.objects.create(
+            text='Что приготовить на обед?', author=cls.user
+        )
+        Comment.objects.create(
+            post=cls.in_comment, author=cls.user, text='Свари борщ'
+        )
+        cls.other = Post.objects.create(text='Про котиков', author=cls.user)
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, query):
+        response = self.client.get(SEARCH, {'q': query})
+        return [post.id for post in response.context['page']]
+
+    def test_ranked_by_post_then_comment(self):
+        """Совпадение в посте выше совпадения в комментарии."""
+        self.assertEqual(
+            self.found('борщ'), [self.in_text.id, self.in_comment.id]
+        )
+        self.assertEqual(self.found('БОРЩА свёкл'), [self.in_text.id])
+        self.assertEqual(self.found('"*) OR ('), [])
+
+    def test_index_follows_changes(self):
+        other = Post.objects.get(pk=self.other.pk)
+        other.text = 'Котики тоже любят борщ'
+        other.save()
+        self.assertIn(other.id, self.found('борщ'))
+        Comment.objects.filter(post=self.in_comment).delete()
+        self.assertNotIn(self.in_comment.id, self.found('борщ'))
+        Post.objects.filter(pk=self.in_text.pk).delete()
+        self.assertEqual(self.found('свёкла'), [])
+
+    def test_paginated(self):
+        Post.objects.bulk_create(
+            Post(text='Суп номер %s' % i, author=self.user)
+            for i in range(POSTS_QUANTITY + 2)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.client.get(SEARCH, {'q': 'суп'})
+        page = response.context['page']
+        self.assertEqual(page.paginator.count, POSTS_QUANTITY + 2)
+        self.assertEqual(len(page), POSTS_QUANTITY)
+        self.assertContains(response, '?q=%D1%81%D1%83%D0%BF&amp;page=2')
+        response = self.client.get(SEARCH, {'q': 'суп', 'page': 2})
+        self.assertEqual(len(response.context['page']), 2)
+
+    def test_admin_uses_index(self):
+        request = RequestFactory().get('/admin/')
+        model_admin = site._registry[Post]
+        queryset, _ = model_admin.get_search_results(
+            request, Post.objects.all(), 'котик'
+        )
+        self.assertIn(search.POST_TABLE, str(queryset.query))
+        self.assertEqual(list(queryset), [self.other])
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts.models import Post, User
+from posts.storage import content_storage
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+OTHER_GIF = SMALL_GIF[:-3] + b'\x0B\x0A\x00\x3B'
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+
+    def tearDown(self):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name='small.gif', content=SMALL_GIF):
+        return Post.objects.create(
+            text='Тестовый текст', author=self.user,
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def put(self, name, content):
+        """Файл в старой раскладке, мимо хранилища."""
+        path = os.path.join(MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(content)
+        return name
+
+    def test_same_upload_is_stored_once(self):
+        first = self.create_post('first.GIF')
+        second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(
+            first.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$'
+        )
+        self.assertNotEqual(
+            self.create_post(content=OTHER_GIF).image.name, first.image.name
+        )
+        self.assertEqual(
+            content_storage.save('posts/again.gif', ContentFile(SMALL_GIF)),
+            first.image.name,
+        )
+
+    def test_reupload_refreshes_mtime(self):
+        """Повторная загрузка не даёт gc_media удалить файл раньше поста."""
+        name = self.create_post().image.name
+        Post.objects.all().delete()
+        path = content_storage.path(name)
+        os.utime(path, (0, 0))
+        content_storage.save('posts/again.gif', ContentFile(SMALL_GIF))
+        call_command('gc_media', min_age=3600, stdout=StringIO())
+        self.assertTrue(content_storage.exists(name))
+        self.assertGreater(os.path.getmtime(path), 0)
+
+    def test_shared_file_outlives_first_post(self):
+        first, second = self.create_post(), self.create_post()
+        name = first.image.name
+        first.delete()
+        content_storage.delete(name)
+        self.assertTrue(content_storage.exists(name))
+        second.delete()
+        content_storage.delete(name)
+        self.assertFalse(content_storage.exists(name))
+
+    def test_dedupe_media(self):
+        first = self.put('posts/first.gif', SMALL_GIF)
+        self.put('posts/nested/copy.gif', SMALL_GIF)
+        other = self.put('posts/other.gif', OTHER_GIF)
+        posts = [
+            Post.objects.create(text=name, author=self.user, image=name)
+            for name in (first, first, other)
+        ]
+        out = StringIO()
+        call_command('dedupe_media', dry_run=True, stdout=out)
+        self.assertIn('перенесено файлов 2, слито дублей 1', out.getvalue())
+        self.assertTrue(content_storage.exists(first))
+        call_command('dedupe_media', stdout=out)
+        call_command('dedupe_media', stdout=out)
+        self.assertIn('перенесено файлов 0, слито дублей 0', out.getvalue())
+        for post in posts:
+            post.refresh_from_db()
+        self.assertEqual(posts[0].image.name, posts[1].image.name)
+        self.assertNotEqual(posts[0].image.name, posts[2].image.name)
+        for post in posts:
+            with post.image.open('rb'):
+                self.assertIn(post.image.read(), (SMALL_GIF, OTHER_GIF))
+        self.assertFalse(content_storage.exists(first))
+        self.assertFalse(content_storage.exists('posts/nested/copy.gif'))
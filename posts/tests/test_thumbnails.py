@@ -0,0 +1,134 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from posts import thumbnails
+from posts.models import Post, User
+from posts.settings import THUMBNAIL_SIZES
+
+INDEX = reverse('index')
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(name='small.gif'):
+    return SimpleUploadedFile(
+        name=name, content=SMALL_GIF, content_type='image/gif'
+    )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_warm_thumbnails_command(self):
+        Post.objects.create(
+            text='Тестовый текст', author=self.user,
+            image=make_image('other.gif'),
+        )
+        Post.objects.create(text='Без картинки', author=self.user)
+        out = StringIO()
+        with mock.patch.object(thumbnails, 'get_thumbnail') as get_thumbnail:
+            call_command('warm_thumbnails', workers=1, stdout=out)
+        self.assertEqual(get_thumbnail.call_count, 1)
+        self.assertIn('Подготовлено картинок: 1', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class PrefetchTest(TestCase):
+    GEOMETRY, OPTIONS = THUMBNAIL_SIZES[0]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        for i in range(3):
+            Post.objects.create(
+                text='Тестовый текст %s' % i, author=cls.user,
+                image=make_image(),
+            )
+        Post.objects.create(text='Без картинки', author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        # Миниатюры «готовы»: их записи лежат в key-value хранилище.
+        self.names = {}
+        for post in Post.objects.exclude(image=''):
+            name = thumbnails.thumbnail_name(
+                post.image, self.GEOMETRY, **self.OPTIONS
+            )
+            thumbnail = ImageFile(name, default.storage)
+            thumbnail.set_size((960, 339))
+            default.kvstore.set(thumbnail)
+            self.names[post.id] = name
+
+    def test_thumbnail_name_matches_sorl(self):
+        """
+        thumbnail_name держится на закрытых методах бэкенда sorl: если
+        они изменятся, get_thumbnail не найдёт готовую миниатюру.
+        """
+        post = Post.objects.exclude(image='').first()
+        with mock.patch.object(
+            default.engine, 'get_image', side_effect=AssertionError
+        ):
+            thumbnail = get_thumbnail(
+                post.image, self.GEOMETRY, **self.OPTIONS
+            )
+        self.assertEqual(thumbnail.name, self.names[post.id])
+
+    def test_prefetch_in_one_query(self):
+        """Промах кэша добирается из БД одним запросом."""
+        posts = list(Post.objects.all())
+        cache.delete_many([
+            add_prefix(ImageFile(name, default.storage).key)
+            for name in self.names.values()
+        ])
+        with self.assertNumQueries(1):
+            thumbnails.prefetch(posts, self.GEOMETRY, **self.OPTIONS)
+        with self.assertNumQueries(0):
+            thumbnails.prefetch(posts, self.GEOMETRY, **self.OPTIONS)
+        self.assertEqual(
+            {post.id: post.thumbnail.name for post in posts if post.image},
+            self.names,
+        )
+        self.assertFalse(any(
+            hasattr(post, 'thumbnail') for post in posts if not post.image
+        ))
+
+    def test_feed_skips_per_tag_lookups(self):
+        with mock.patch.object(
+            default.kvstore, 'get', side_effect=AssertionError
+        ):
+            response = self.client.get(INDEX)
+        for name in self.names.values():
+            self.assertContains(response, default.storage.url(name))
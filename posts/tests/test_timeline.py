@@ -0,0 +1,167 @@
+import os
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Follow, Post, ProfileStats, TimelineEntry, User
+from posts.timeline import TimelinePaginator
+
+FOLLOW_INDEX = reverse('follow_index')
+
+
+def timeline_posts(user, per_page=100):
+    return list(TimelinePaginator(user, Post.objects.all(), per_page).page())
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.reader = User.objects.create_user(username='TestReader')
+        cls.old_post = Post.objects.create(
+            text='Старый пост', author=cls.author
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def follow(self):
+        self.client.get(reverse('profile_follow', args=[self.author]))
+
+    def test_fan_out_backfill_and_prune(self):
+        """ Лента заполняется подпиской и постами, чистится отпиской """
+        self.follow()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post
+        ).exists())
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=new_post
+        ).exists())
+        response = self.client.get(FOLLOW_INDEX)
+        self.assertEqual(list(response.context['page']), [
+            new_post, self.old_post
+        ])
+        self.client.get(reverse('profile_unfollow', args=[self.author]))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+        self.assertEqual(len(self.client.get(FOLLOW_INDEX).context['page']), 0)
+
+    @mock.patch('posts.timeline.TIMELINE_FANOUT_LIMIT', 1)
+    def test_popular_author_is_pulled(self):
+        """ Посты популярного автора подмешиваются при чтении """
+        self.follow()
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=new_post).exists()
+        )
+        self.assertTrue(new_post.pulled)
+        self.assertEqual(
+            timeline_posts(self.reader), [new_post, self.old_post]
+        )
+
+    @mock.patch('posts.timeline.TIMELINE_FANOUT_LIMIT', 1)
+    def test_popular_author_without_stats_is_pulled(self):
+        """ Популярный автор без строки счётчиков не выпадает из ленты """
+        ProfileStats.objects.filter(user=self.author).delete()
+        Follow.objects.bulk_create([
+            Follow(user=self.reader, author=self.author)
+        ])
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=new_post).exists()
+        )
+        self.assertEqual(timeline_posts(self.reader), [new_post])
+
+    @mock.patch('posts.timeline.TIMELINE_FANOUT_LIMIT', 2)
+    def test_pulled_post_survives_losing_followers(self):
+        """ Пост, не разосланный при популярности автора, не пропадает """
+        self.follow()
+        other = User.objects.create_user(username='OtherReader')
+        Follow.objects.create(user=other, author=self.author)
+        pulled = Post.objects.create(text='Для всех', author=self.author)
+        self.assertTrue(pulled.pulled)
+        Follow.objects.filter(user=other).delete()
+        pushed = Post.objects.create(text='Снова раздан', author=self.author)
+        self.assertFalse(pushed.pulled)
+        self.assertEqual(
+            timeline_posts(self.reader), [pushed, pulled, self.old_post]
+        )
+
+    @mock.patch('posts.timeline.TIMELINE_FANOUT_LIMIT', 2)
+    def test_pages_merge_pulled_posts(self):
+        """ Курсор листает записи ленты и подмешанные посты вместе """
+        self.follow()
+        other = User.objects.create_user(username='OtherReader')
+        posts = [self.old_post]
+        for number in range(6):
+            if number == 3:
+                Follow.objects.create(user=other, author=self.author)
+            posts.append(Post.objects.create(
+                text=f'Пост {number}', author=self.author
+            ))
+        posts.reverse()
+        self.assertEqual(
+            [post.pulled for post in posts],
+            [True, True, True, False, False, False, False],
+        )
+        paginator = TimelinePaginator(self.reader, Post.objects.all(), 2)
+        page, seen = paginator.page(), []
+        while True:
+            seen += list(page)
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+        self.assertEqual(seen, posts)
+        page = paginator.page(page.previous_cursor)
+        self.assertEqual(list(page), posts[4:6])
+        # Записи ленты читаются по индексу, без сортировки.
+        plan = ' '.join(
+            str(row) for row in paginator.entries.values_list(
+                'post_id'
+            )[:3].explain().splitlines()
+        )
+        self.assertIn('timeline_user_pub_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    @mock.patch('posts.timeline.TIMELINE_MAX_ENTRIES', 2)
+    @mock.patch(
+        'posts.management.commands.trim_timelines.TIMELINE_MAX_ENTRIES', 2
+    )
+    def test_trim_timelines(self):
+        self.follow()
+        posts = [
+            Post.objects.create(text=f'Пост {number}', author=self.author)
+            for number in range(3)
+        ]
+        out = StringIO()
+        call_command('trim_timelines', stdout=out)
+        self.assertIn('удалено записей: 2', out.getvalue())
+        self.assertEqual(timeline_posts(self.reader), posts[:0:-1])
+
+    @mock.patch('posts.timeline.TIMELINE_BACKFILL', 1)
+    def test_backfill_limit_is_shown(self):
+        """ Последняя страница ленты говорит, что ранние посты не вошли """
+        Post.objects.create(text='Новый пост', author=self.author)
+        self.follow()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 1
+        )
+        self.assertContains(
+            self.client.get(FOLLOW_INDEX), 'более ранние остаются'
+        )
+
+    def test_rebuild_timelines(self):
+        Follow.objects.bulk_create([
+            Follow(user=self.reader, author=self.author)
+        ])
+        self.assertFalse(TimelineEntry.objects.exists())
+        with open(os.devnull, 'w') as devnull:
+            call_command('rebuild_timelines', stdout=devnull)
+        self.assertEqual(timeline_posts(self.reader), [self.old_post])
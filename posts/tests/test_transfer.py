@@ -0,0 +1,139 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post, ProfileStats, User
+
+
+class TransferTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='TestUser')
+        self.reader = User.objects.create_user(username='TestReader')
+        group = Group.objects.create(
+            title='test_title', slug='test-group', description='описание'
+        )
+        for i in range(5):
+            post = Post.objects.create(
+                text='Тестовый текст %s' % i, author=self.author,
+                group=group if i % 2 else None,
+            )
+            Comment.objects.create(
+                post=post, author=self.reader, text='Комментарий, "%s"' % i
+            )
+        Post.objects.update(pub_date=timezone.now() - timedelta(days=30))
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'posts.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def snapshot(self):
+        return (
+            list(Post.objects.order_by('id').values_list(
+                'id', 'text', 'author__username', 'group__slug', 'pub_date'
+            )),
+            list(Comment.objects.order_by('id').values_list(
+                'id', 'post_id', 'author__username', 'text', 'created'
+            )),
+            list(Follow.objects.values_list(
+                'user__username', 'author__username'
+            )),
+        )
+
+    def roundtrip(self, *args, **options):
+        call_command(
+            'export_posts', self.path, *args, stderr=StringIO(), **options
+        )
+        before = self.snapshot()
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        out = StringIO()
+        call_command('import_posts', self.path, batch_size=2, stdout=out)
+        self.assertEqual(self.snapshot(), before)
+        return out.getvalue()
+
+    def test_jsonl_roundtrip(self):
+        out = self.roundtrip(batch_size=2)
+        self.assertIn('Загружено строк: 11', out)
+        self.assertIn('строк/с', out)
+        stats = ProfileStats.objects.get(user=self.author)
+        self.assertEqual((stats.posts_count, stats.followers_count), (5, 1))
+        self.assertEqual(Post.objects.filter(comment_count=1).count(), 5)
+        self.assertEqual(self.reader.timeline.count(), 5)
+
+    def test_csv_roundtrip(self):
+        self.path = os.path.join(self.dir, 'posts.csv')
+        call_command(
+            'export_posts', self.path, models='post', stderr=StringIO()
+        )
+        posts = self.snapshot()[0]
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        call_command('import_posts', self.path, stdout=StringIO())
+        self.assertEqual(self.snapshot()[0], posts)
+
+    def test_import_into_non_empty_database_is_refused(self):
+        call_command('export_posts', self.path, stderr=StringIO())
+        before = self.snapshot()
+        with self.assertRaises(CommandError):
+            call_command(
+                'import_posts', self.path, skip_rebuild=True,
+                stdout=StringIO(),
+            )
+        self.assertEqual(self.snapshot(), before)
+
+    def test_orphan_comments_are_skipped(self):
+        call_command('export_posts', self.path, stderr=StringIO())
+        with open(self.path, encoding='utf-8') as dump:
+            rows = [
+                row for row in map(json.loads, dump)
+                if row['model'] != 'post' or row['text'] != 'Тестовый текст 0'
+            ]
+        with open(self.path, 'w', encoding='utf-8') as dump:
+            dump.writelines(json.dumps(row) + '\n' for row in rows)
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        out = StringIO()
+        call_command('import_posts', self.path, stdout=out)
+        self.assertIn('Загружено строк: 9 (post: 4, comment: 4, follow: 1)',
+                      out.getvalue())
+        self.assertIn('Пропущено комментариев к постам не из файла: 1',
+                      out.getvalue())
+        self.assertEqual(Comment.objects.count(), 4)
+        # Последовательность id догнала загруженные строки.
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertGreater(post.id, max(row.get('id', 0) for row in rows))
+
+    def test_missing_users_are_created(self):
+        call_command('export_posts', self.path, stderr=StringIO())
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        User.objects.filter(username='TestUser').delete()
+        call_command('import_posts', self.path, stdout=StringIO())
+        author = User.objects.get(username='TestUser')
+        self.assertFalse(author.has_usable_password())
+        self.assertEqual(author.posts.count(), 5)
+
+    def test_repeated_follow_across_batches(self):
+        follow = {'model': 'follow', 'user': 'TestReader',
+                  'author': 'TestUser'}
+        other = dict(follow, author='Other')
+        with open(self.path, 'w', encoding='utf-8') as dump:
+            for row in (follow, other, follow):
+                dump.write(json.dumps(row) + '\n')
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        call_command('import_posts', self.path, batch_size=2,
+                     stdout=StringIO())
+        self.assertEqual(
+            sorted(Follow.objects.values_list('author__username', flat=True)),
+            ['Other', 'TestUser'],
+        )
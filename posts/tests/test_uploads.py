@@ -0,0 +1,185 @@
+import datetime
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from posts import forms, uploads
+from posts.models import Post, User
+
+INDEX = reverse('index')
+NEW_POST = reverse('new_post')
+ORIENTATION = 0x0112
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_photo(name='photo.jpg', size=(80, 40)):
+    """JPEG «с телефона»: повёрнут тегом EXIF и несёт метаданные."""
+    exif = Image.Exif()
+    exif[ORIENTATION] = 6
+    exif[0x010F] = 'Camera'
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile(
+        name=name, content=buffer.getvalue(), content_type='image/jpeg'
+    )
+
+
+def stored_files():
+    return {
+        os.path.join(path, name)
+        for path, _, names in os.walk(os.path.join(MEDIA_ROOT, 'posts'))
+        for name in names
+    }
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class UploadsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+
+    def tearDown(self):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_new_post_schedules_processing(self):
+        """Картинка нового поста уходит в пул после коммита."""
+        with mock.patch.object(
+            uploads, 'transaction'
+        ) as transaction, mock.patch.object(
+            uploads._executor, 'submit'
+        ) as submit:
+            self.client.post(
+                NEW_POST, {'text': 'С картинкой', 'image': make_photo()}
+            )
+            self.client.post(NEW_POST, {'text': 'Без картинки'})
+            self.assertEqual(transaction.on_commit.call_count, 1)
+            transaction.on_commit.call_args[0][0]()
+        post = Post.objects.get(text='С картинкой')
+        submit.assert_called_once_with(uploads.process_post, post.id)
+        self.assertFalse(post.image_ready)
+        self.assertTrue(Post.objects.get(text='Без картинки').image_ready)
+        self.assertContains(self.client.get(INDEX), 'Картинка обрабатывается')
+
+    def test_process_post(self):
+        post = Post.objects.create(
+            text='Тестовый текст', author=self.user,
+            image=make_photo(), image_ready=False,
+        )
+        original = post.image.name
+        with mock.patch.object(
+            uploads, 'IMAGE_MAX_SIDE', 20
+        ), mock.patch.object(
+            uploads.variants, 'generate'
+        ) as generate, mock.patch.object(
+            uploads.thumbnails, 'warm'
+        ) as warm:
+            uploads.process_post(post.id)
+        post.refresh_from_db()
+        self.assertTrue(post.image_ready)
+        self.assertNotEqual(post.image.name, original)
+        # Исходник удалит gc_media, а не обработка.
+        self.assertTrue(post.image.storage.exists(original))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (10, 20))
+            self.assertEqual(dict(image.getexif()), {})
+        self.assertEqual(generate.call_args[0][0].image.name, post.image.name)
+        self.assertEqual(warm.call_args[0][0].name, post.image.name)
+
+    def test_replaced_image_is_kept(self):
+        """Обработка не затирает картинку, которую автор уже сменил."""
+        post = Post.objects.create(
+            text='Тестовый текст', author=self.user,
+            image=make_photo(), image_ready=False,
+        )
+        Post.objects.filter(pk=post.pk).update(image='posts/other.jpg')
+        files = stored_files()
+        self.assertIsNone(uploads.process(post))
+        self.assertEqual(
+            Post.objects.get(pk=post.pk).image.name, 'posts/other.jpg'
+        )
+        # Исходник остался, обработанную копию уберёт gc_media.
+        self.assertLessEqual(files, stored_files())
+
+    def test_broken_image_is_marked_failed(self):
+        """Битая картинка не оставляет заглушку «обрабатывается» навсегда."""
+        photo = make_photo()
+        photo.file.truncate(len(photo.read()) // 2)
+        post = Post.objects.create(
+            text='Обрезанная картинка', author=self.user,
+            image=photo, image_ready=False,
+        )
+        uploads.process_post(post.id)
+        post.refresh_from_db()
+        self.assertTrue(post.image_failed)
+        self.assertFalse(post.image_ready)
+        self.assertContains(
+            self.client.get(INDEX), 'Картинку не удалось обработать'
+        )
+
+    def test_process_images(self):
+        """Команда подбирает картинки, потерянные пулом при перезапуске."""
+        long_ago = timezone.now() - datetime.timedelta(hours=1)
+        lost, fresh, failed = (
+            Post.objects.create(
+                text=text, author=self.user, image=make_photo(),
+                image_ready=False, image_queued_at=queued_at,
+                image_failed=text == 'Сбой',
+            )
+            for text, queued_at in (
+                ('Потерян', long_ago), ('Свежий', timezone.now()),
+                ('Сбой', long_ago),
+            )
+        )
+        out = StringIO()
+        with mock.patch.object(uploads.variants, 'generate'), \
+                mock.patch.object(uploads.thumbnails, 'warm'):
+            call_command('process_images', stdout=out)
+            self.assertIn('Обработано картинок: 1', out.getvalue())
+            self.assertEqual(
+                list(Post.objects.filter(image_ready=True).exclude(
+                    image=''
+                )),
+                [lost],
+            )
+            call_command('process_images', failed=True, stdout=out)
+        failed.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertTrue(failed.image_ready)
+        self.assertFalse(failed.image_failed)
+        self.assertFalse(fresh.image_ready)
+
+    def test_oversized_upload(self):
+        photo = make_photo()
+        with mock.patch.object(uploads, 'IMAGE_UPLOAD_MAX_BYTES', 100):
+            response = self.client.post(
+                NEW_POST, {'text': 'Большая картинка', 'image': photo}
+            )
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 10 МБ'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_resolution_checked_by_header(self):
+        with mock.patch.object(forms, 'IMAGE_MAX_PIXELS', 100):
+            response = self.client.post(
+                NEW_POST, {'text': 'Огромная картинка', 'image': make_photo()}
+            )
+        self.assertFormError(
+            response, 'form', 'image', 'Слишком большое разрешение картинки'
+        )
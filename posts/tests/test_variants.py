@@ -0,0 +1,130 @@
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import variants
+from posts.imaging import render_variants
+from posts.models import ImageVariant, Post, User
+from posts.settings import IMAGE_VARIANT_RATIO
+
+INDEX = reverse('index')
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_jpeg(size=(1000, 500)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'blue').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class RenderVariantsTest(TestCase):
+    def test_widths_and_formats(self):
+        rendered = render_variants(
+            make_jpeg(), (320, 640, 960, 1280), ('webp', 'jpeg'),
+            IMAGE_VARIANT_RATIO, 80,
+        )
+        self.assertEqual(
+            [(width, height, image_format)
+             for width, height, image_format, _ in rendered],
+            [(320, 113, 'webp'), (320, 113, 'jpeg'),
+             (640, 226, 'webp'), (640, 226, 'jpeg'),
+             (960, 339, 'webp'), (960, 339, 'jpeg')],
+        )
+        for width, height, image_format, data in rendered:
+            with Image.open(BytesIO(data)) as image:
+                self.assertEqual(image.format.lower(), image_format)
+                self.assertEqual(image.size, (width, height))
+
+    def test_one_pool_for_concurrent_renders(self):
+        def slow_pool(**kwargs):
+            time.sleep(0.05)
+            return mock.Mock()
+
+        with mock.patch.object(variants, '_pool', None), mock.patch.object(
+            variants, 'IMAGE_VARIANT_PROCESSES', 2
+        ), mock.patch.object(
+            variants, 'ProcessPoolExecutor', side_effect=slow_pool
+        ) as pool:
+            with ThreadPoolExecutor(4) as executor:
+                list(executor.map(variants.render, [b''] * 4))
+        self.assertEqual(pool.call_count, 1)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class VariantsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_post(self, data):
+        return Post.objects.create(
+            text='Тестовый текст', author=self.user,
+            image=SimpleUploadedFile('photo.jpg', data, 'image/jpeg'),
+        )
+
+    def test_generate_dedupes_by_content(self):
+        """Одинаковая картинка двух постов нарезается один раз, в пуле."""
+        data = make_jpeg()
+        first, second = self.create_post(data), self.create_post(data)
+        with mock.patch.object(
+            variants, 'render', wraps=variants.render
+        ) as render:
+            variants.generate(first)
+            variants.generate(second)
+        self.assertEqual(render.call_count, 1)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image_digest, second.image_digest)
+        self.assertEqual(first.image.name, second.image.name)
+        found = ImageVariant.objects.filter(digest=first.image_digest)
+        self.assertEqual(found.count(), 6)
+        for variant in found:
+            self.assertEqual(variant.file.size, variant.size)
+
+    @mock.patch.object(variants, 'IMAGE_VARIANT_PROCESSES', 0)
+    def test_feed_and_post_render_srcset(self):
+        post = self.create_post(make_jpeg())
+        variants.generate(post)
+        with self.assertNumQueries(1):
+            variants.prefetch([post])
+        self.assertIn('640w', post.variants.webp)
+        self.assertTrue(post.variants.src.file.url.endswith('-960.jpg'))
+        urls = [INDEX, reverse('post', args=[self.user.username, post.id])]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'type="image/webp"')
+                self.assertContains(response, post.variants.jpeg)
+
+    @mock.patch.object(variants, 'IMAGE_VARIANT_PROCESSES', 0)
+    def test_generate_variants_command(self):
+        post = self.create_post(make_jpeg((400, 200)))
+        Post.objects.create(text='Без картинки', author=self.user)
+        out = StringIO()
+        call_command('generate_variants', workers=1, stdout=out)
+        call_command('generate_variants', workers=1, stdout=out)
+        self.assertIn('Обработано картинок: 1', out.getvalue())
+        self.assertIn('Обработано картинок: 0', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(
+            list(ImageVariant.objects.filter(
+                digest=post.image_digest
+            ).values_list('width', 'format')),
+            [(320, 'jpeg'), (320, 'webp')],
+        )
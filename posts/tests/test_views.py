@@ -1,14 +1,20 @@
+import os
 import shutil
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.core.cache import caches
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.query import QuerySet
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Follow, Group, Post, User
-from posts.settings import POSTS_QUANTITY
+from posts.models import Comment, Follow, Group, Post, ProfileStats, User
+from posts.settings import COMMENTS_QUANTITY, POSTS_QUANTITY
 
 INDEX = reverse('index')
 NEW_POST = reverse('new_post')
@@ -173,15 +179,437 @@ class CachesTest(TestCase):
 
     def setUp(self):
         self.guest_client = Client()
+        self.user = User.objects.create_user(username='TestUser')
+        self.post = Post.objects.create(
+            text='Тестовый текст',
+            author=self.user,
+        )
+        caches['default'].clear()
 
     def test_index_cache_instantly(self):
+        """ Лента отдаётся из кэша, пока посты не менялись """
         response_before = self.guest_client.get(INDEX)
-        Post.objects.create(
-            text='Тестовый текст',
-            author=User.objects.create_user(username='TestUser'),
-        )
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
         response_after = self.guest_client.get(INDEX)
         self.assertEqual(
             response_before.content,
             response_after.content
         )
+
+    def test_index_cache_invalidated(self):
+        """ Новый пост, комментарий или группа сбрасывают кэш ленты """
+        group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        author_client = Client()
+        author_client.force_login(self.user)
+
+        def rename_group():
+            group.title = 'Новое название'
+            group.save()
+
+        changes = [
+            (
+                lambda: Post.objects.create(
+                    text='Новый пост', author=self.user
+                ),
+                'Новый пост',
+            ),
+            (
+                lambda: author_client.post(
+                    reverse(
+                        'add_comment', args=[self.user.username, self.post.id]
+                    ),
+                    {'text': 'Комментарий'},
+                ),
+                'Комментариев',
+            ),
+            (rename_group, 'Новое название'),
+        ]
+        for change, expected in changes:
+            with self.subTest(expected=expected):
+                self.assertNotContains(self.guest_client.get(INDEX), expected)
+                change()
+                self.assertContains(self.guest_client.get(INDEX), expected)
+
+    def test_cache_varies_on_page_and_user(self):
+        Post.objects.bulk_create(
+            Post(text='Текст %s' % i, author=self.user)
+            for i in range(POSTS_QUANTITY)
+        )
+        first = self.guest_client.get(INDEX)
+        second = self.guest_client.get(
+            INDEX, {'cursor': first.context['page'].next_cursor}
+        )
+        self.assertContains(second, self.post.text)
+        self.assertNotContains(first, self.post.text)
+        author_client = Client()
+        author_client.force_login(self.user)
+        edit = reverse('post_edit', args=[self.user.username, self.post.id])
+        self.assertContains(
+            author_client.get(INDEX, {'page': 2}), edit
+        )
+        self.assertNotContains(self.guest_client.get(INDEX, {'page': 2}), edit)
+
+    def test_follow_cache_is_personal(self):
+        """ Лента подписок в кэше своя у каждого и меняется с подпиской """
+        follower = User.objects.create_user(username='TestUser2')
+        follower_client = Client()
+        follower_client.force_login(follower)
+        reader_client = Client()
+        reader_client.force_login(
+            User.objects.create_user(username='TestUser3')
+        )
+        self.assertNotContains(
+            follower_client.get(FOLLOW_INDEX), self.post.text
+        )
+        follower_client.get(PROFILE_FOLLOW)
+        self.assertContains(follower_client.get(FOLLOW_INDEX), self.post.text)
+        self.assertNotContains(reader_client.get(FOLLOW_INDEX), self.post.text)
+        follower_client.get(PROFILE_UNFOLLOW)
+        self.assertNotContains(
+            follower_client.get(FOLLOW_INDEX), self.post.text
+        )
+
+
+class ConditionalGetTest(TestCase):
+    """ Неизменившаяся страница отдаётся ответом 304 без отрисовки """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='TestUser')
+        self.post = Post.objects.create(
+            text='Тестовый текст', author=self.user
+        )
+        self.POST = reverse('post', args=[self.user.username, self.post.id])
+        self.guest_client = Client()
+        self.follower_client = Client()
+        self.follower_client.force_login(
+            User.objects.create_user(username='TestUser2')
+        )
+
+    def assertNotModified(self, url, client=None):
+        client = client or self.guest_client
+        etag = client.get(url)['ETag']
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def test_not_modified_without_queries(self):
+        for url in [INDEX, PROFILE, self.POST]:
+            with self.subTest(url=url):
+                etag = self.assertNotModified(url)
+                with self.assertNumQueries(0):
+                    self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_changes_refresh_etag(self):
+        comment = reverse(
+            'add_comment', args=[self.user.username, self.post.id]
+        )
+        changes = [
+            (
+                lambda: Post.objects.create(
+                    text='Новый пост', author=self.user
+                ),
+                [INDEX, PROFILE],
+            ),
+            (
+                lambda: self.follower_client.post(comment, {'text': 'Текст'}),
+                [INDEX, self.POST],
+            ),
+            (
+                lambda: self.follower_client.get(PROFILE_FOLLOW),
+                [PROFILE, self.POST],
+            ),
+        ]
+        for change, urls in changes:
+            etags = {url: self.assertNotModified(url) for url in urls}
+            change()
+            for url in urls:
+                with self.subTest(url=url):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etags[url]
+                    )
+                    self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(
+            self.guest_client.get(INDEX)['ETag'],
+            self.follower_client.get(INDEX)['ETag'],
+        )
+
+    def test_post_page_ignores_other_posts(self):
+        """ Чужие посты и комментарии не сбрасывают 304 страницы записи """
+        etag = self.assertNotModified(self.POST)
+        # Автор другой: новый пост автора меняет его счётчик на странице.
+        author = User.objects.create_user(username='OtherAuthor')
+        other = Post.objects.create(text='Другой пост', author=author)
+        Comment.objects.create(post=other, author=author, text='Текст')
+        response = self.guest_client.get(self.POST, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Group.objects.create(title='Группа', slug='group')
+        response = self.guest_client.get(self.POST, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class FeedQueriesTest(TestCase):
+    """Число запросов ленты не зависит от числа постов и комментариев."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='test_title',
+            slug='test-group',
+            description='test_description',
+        )
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.reader = User.objects.create_user(username='TestReader')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def seed(self, quantity):
+        for i in range(quantity):
+            post = Post.objects.create(
+                text='Тестовый текст %s' % i,
+                author=self.user,
+                group=self.group,
+            )
+            Comment.objects.create(
+                post=post, author=self.reader, text='Комментарий'
+            )
+
+    def count_queries(self, url):
+        self.client.get(url)
+        caches['default'].clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_feed_query_count_is_constant(self):
+        urls = [INDEX, GROUP_POSTS, PROFILE, FOLLOW_INDEX]
+        self.seed(1)
+        small = {url: self.count_queries(url) for url in urls}
+        post = Post.objects.first()
+        small['post'] = self.count_queries(
+            reverse('post', args=[self.user.username, post.id])
+        )
+        self.seed(POSTS_QUANTITY)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), small[url])
+        with self.subTest(url='post'):
+            self.assertEqual(
+                self.count_queries(
+                    reverse('post', args=[self.user.username, post.id])
+                ),
+                small['post'],
+            )
+
+
+class CommentThreadTest(TestCase):
+    """Под постом начало ветки, остальное на отдельных страницах."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text='Комментарий %s' % i)
+            for i in range(COMMENTS_QUANTITY + 5)
+        )
+        cls.post.comment_count = COMMENTS_QUANTITY + 5
+        cls.post.save()
+        cls.expected = list(
+            cls.post.comments.order_by('created', 'id').values_list(
+                'id', flat=True
+            )
+        )
+        cls.url = reverse('post', args=[cls.user.username, cls.post.id])
+        cls.thread = reverse(
+            'post_comments', args=[cls.user.username, cls.post.id]
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_post_page_shows_thread_start(self):
+        response = self.client.get(self.url)
+        comments = response.context['comments']
+        self.assertIsInstance(comments, QuerySet)
+        self.assertEqual(
+            [comment.id for comment in comments],
+            self.expected[:COMMENTS_QUANTITY],
+        )
+        # Ссылка ведёт сразу к комментариям, которых под постом нет.
+        cursor = response.context['comments_cursor']
+        self.assertContains(response, f'{self.thread}?cursor={cursor}')
+        rest = self.client.get(self.thread, {'cursor': cursor})
+        self.assertEqual(
+            [comment.id for comment in rest.context['page']],
+            self.expected[COMMENTS_QUANTITY:],
+        )
+
+    def test_thread_pages(self):
+        first = self.client.get(self.thread).context['page']
+        self.assertEqual(
+            [comment.id for comment in first],
+            self.expected[:COMMENTS_QUANTITY],
+        )
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(
+                self.thread, {'cursor': first.next_cursor}
+            ).context['page']
+        self.assertEqual(
+            [comment.id for comment in second],
+            self.expected[COMMENTS_QUANTITY:],
+        )
+        self.assertFalse(second.has_next())
+        # Авторы приходят в том же запросе, что и комментарии.
+        comment_queries = [
+            query for query in queries if 'posts_comment' in query['sql']
+        ]
+        self.assertEqual(len(comment_queries), 1)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.follower = User.objects.create_user(username='TestUser2')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.follower)
+
+    def test_views_update_counters(self):
+        """ Счётчики меняются вместе с подписками, постами и комментариями """
+        self.client.get(PROFILE_FOLLOW)
+        self.client.get(PROFILE_FOLLOW)
+        self.assertEqual(
+            ProfileStats.objects.get(user=self.user).followers_count, 1
+        )
+        self.assertEqual(
+            ProfileStats.objects.get(user=self.follower).following_count, 1
+        )
+        self.client.post(NEW_POST, {'text': 'Тестовый текст'})
+        post = Post.objects.get(author=self.follower)
+        self.client.post(
+            reverse('add_comment', args=[self.follower.username, post.id]),
+            {'text': 'Комментарий'},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.client.get(PROFILE_UNFOLLOW)
+        stats = ProfileStats.objects.get(user=self.follower)
+        self.assertEqual(
+            (stats.followers_count, stats.following_count, stats.posts_count),
+            (0, 0, 1),
+        )
+        response = self.client.get(PROFILE)
+        self.assertEqual(response.context['stats'].followers_count, 0)
+
+    def test_deletes_update_counters(self):
+        """ Удаление из админки и каскадом уменьшает счётчики """
+        author = User.objects.create_user(username='TestUser3')
+        self.client.force_login(author)
+        for text in ('Первый', 'Второй'):
+            self.client.post(NEW_POST, {'text': text})
+        first, second = Post.objects.filter(author=author)
+        for post in (first, first, second):
+            self.client.post(
+                reverse('add_comment', args=[author.username, post.id]),
+                {'text': 'Комментарий'},
+            )
+        first.comments.first().delete()
+        first.refresh_from_db()
+        self.assertEqual(first.comment_count, 1)
+        second.delete()
+        self.assertEqual(ProfileStats.objects.get(user=author).posts_count, 1)
+        self.assertFalse(Comment.objects.filter(post_id=second.id).exists())
+        # Вместе с автором удаляется и его строка счётчиков: заново
+        # она не заводится.
+        author_id = author.id
+        author.delete()
+        self.assertFalse(
+            ProfileStats.objects.filter(user_id=author_id).exists()
+        )
+
+    def test_orm_changes_update_counters(self):
+        """ Записи мимо представлений сдвигают счётчики так же """
+        author = User.objects.create_user(username='TestUser4')
+        reader = User.objects.create_user(username='TestUser5')
+        post = Post.objects.create(text='Из админки', author=author)
+        Comment.objects.create(post=post, author=reader, text='Текст')
+        Follow.objects.create(user=reader, author=author)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        stats = ProfileStats.objects.get(user=author)
+        self.assertEqual((stats.posts_count, stats.followers_count), (1, 1))
+        self.assertEqual(
+            ProfileStats.objects.get(user=reader).following_count, 1
+        )
+        # Страница другой записи автора показывает его число постов.
+        other = Post.objects.create(text='Вторая', author=author)
+        page = reverse('post', args=[author.username, other.id])
+        etag = self.client.get(page)['ETag']
+        Post.objects.filter(pk=post.pk).delete()
+        self.assertEqual(
+            self.client.get(page, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+        # Подписчик удалён каскадом вместе с подпиской.
+        reader.delete()
+        stats = ProfileStats.objects.get(user=author)
+        self.assertEqual((stats.posts_count, stats.followers_count), (1, 0))
+
+    def test_concurrent_follow(self):
+        """ Подписка из параллельного запроса не считается дважды """
+        self.client.get(PROFILE_FOLLOW)
+        get = QuerySet.get
+        raced = []
+
+        def racing_get(queryset, *args, **kwargs):
+            if queryset.model is Follow and not raced:
+                raced.append(True)
+                raise Follow.DoesNotExist
+            return get(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'get', racing_get):
+            response = self.client.get(PROFILE_FOLLOW)
+        self.assertTrue(raced)
+        self.assertRedirects(response, PROFILE)
+        self.assertEqual(
+            Follow.objects.filter(
+                user=self.follower, author=self.user
+            ).count(),
+            1,
+        )
+        self.assertEqual(
+            ProfileStats.objects.get(user=self.user).followers_count, 1
+        )
+
+    def test_recount_stats_repairs_drift(self):
+        post = Post.objects.create(text='Тестовый текст', author=self.user)
+        Comment.objects.create(post=post, author=self.user, text='Текст')
+        Follow.objects.create(user=self.follower, author=self.user)
+        other = Post.objects.create(text='Без комментариев', author=self.user)
+        ProfileStats.objects.filter(user=self.user).update(followers_count=7)
+        Post.objects.update(comment_count=5)
+        etag = self.client.get(INDEX)['ETag']
+        with open(os.devnull, 'w') as devnull:
+            call_command('recount_stats', batch_size=1, stdout=devnull)
+        post.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((post.comment_count, other.comment_count), (1, 0))
+        self.assertEqual(
+            self.client.get(INDEX, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+        stats = ProfileStats.objects.get(user=self.user)
+        self.assertEqual(
+            (stats.followers_count, stats.following_count, stats.posts_count),
+            (1, 0, 2),
+        )
+        self.assertEqual(
+            ProfileStats.objects.get(user=self.follower).following_count, 1
+        )
@@ -0,0 +1,94 @@
+"""
+Фоновая подготовка миниатюр.
+
+Тег {% thumbnail %} при первом показе картинки декодирует и ужимает её
+прямо в запросе. Чтобы этого не происходило, фоновый пул posts.uploads
+после обработки картинки рендерит все размеры из THUMBNAIL_SIZES, и
+шаблон находит миниатюру уже готовой.
+
+prefetch() достаёт из key-value хранилища sorl-thumbnail сведения о
+миниатюрах целой страницы ленты одним get_many и одним запросом к БД
+вместо отдельного обращения на каждый тег {% thumbnail %}.
+
+Имя миниатюры без её рендеринга публичный API sorl не отдаёт, поэтому
+thumbnail_name повторяет get_thumbnail через закрытые методы бэкенда.
+Версия sorl-thumbnail закреплена в requirements.txt, а тест
+test_thumbnail_name_matches_sorl упадёт, если эти методы изменятся.
+"""
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from posts.settings import THUMBNAIL_SIZES
+
+
+def warm(image):
+    """Рендерит все размеры миниатюр для картинки."""
+    for geometry, options in THUMBNAIL_SIZES:
+        get_thumbnail(image, geometry, **options)
+
+
+def thumbnail_name(image, geometry, **options):
+    """Имя файла миниатюры, которое выберет get_thumbnail."""
+    backend = default.backend
+    source = ImageFile(image)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return backend._get_thumbnail_filename(source, geometry, options)
+
+
+def prefetch(posts, geometry, **options):
+    """
+    Проставляет постам с картинкой post.thumbnail из key-value
+    хранилища. Чего там нет, остаётся тегу {% thumbnail %}: он создаст
+    миниатюру как обычно.
+    """
+    keys = {}
+    files = {}
+    for post in posts:
+        if post.image and post.image_ready \
+                and not hasattr(post, 'variants'):
+            thumbnail = ImageFile(
+                thumbnail_name(post.image, geometry, **options),
+                default.storage,
+            )
+            key = add_prefix(thumbnail.key)
+            keys.setdefault(key, []).append(post)
+            files[key] = thumbnail
+    for key, thumbnail in fetch(files).items():
+        for post in keys[key]:
+            post.thumbnail = thumbnail
+
+
+def fetch(files):
+    """Миниатюры из key-value хранилища, которые там нашлись, по ключам."""
+    if not files:
+        return {}
+    kvstore = default.kvstore
+    cache = getattr(kvstore, 'cache', None)
+    if cache is None:
+        # Перед хранилищем нет кэша: спрашиваем по одной миниатюре.
+        found = {key: kvstore.get(image) for key, image in files.items()}
+        return {key: image for key, image in found.items() if image}
+    values = cache.get_many(list(files))
+    missing = [key for key in files if key not in values]
+    if missing:
+        found = dict(KVStore.objects.filter(key__in=missing).values_list(
+            'key', 'value'
+        ))
+        cache.set_many(found, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    # EMPTY_VALUE - отметка cached_db о том, что ключа нет и в БД.
+    return {
+        key: deserialize_image_file(value)
+        for key, value in values.items() if isinstance(value, str)
+    }
@@ -0,0 +1,141 @@
+"""
+Лента подписок с раздачей при записи (fan-out on write).
+
+Новый пост сразу раскладывается по лентам подписчиков автора, и
+страница /follow/ читает готовую таблицу TimelineEntry вместо JOIN-а
+Follow и Post. Посты авторов с огромным числом подписчиков не
+раздаются: такой пост помечается Post.pulled и подмешивается в ленту
+при чтении, иначе одна публикация превращалась бы в миллионы вставок.
+Пометка остаётся у поста навсегда, поэтому пост не пропадает из лент,
+когда автор теряет подписчиков, и догонять ленты при переходе порога
+не нужно.
+
+Лента листается курсором (TimelinePaginator) по индексу
+(user, -pub_date, -post) записей, а подмешанные посты читаются тем же
+окном отдельным запросом. Старше TIMELINE_MAX_ENTRIES записей в ленте
+не хранится: лишние удаляет команда trim_timelines.
+"""
+
+from posts.models import Follow, Post, ProfileStats, TimelineEntry
+from posts.paginators import NEXT, CursorPaginator
+from posts.settings import (TIMELINE_BACKFILL, TIMELINE_BATCH_SIZE,
+                            TIMELINE_FANOUT_LIMIT, TIMELINE_MAX_ENTRIES)
+
+
+def is_pulled(author):
+    # Недостающая строка счётчиков заводится, иначе популярного автора
+    # без неё раздали бы всем подписчикам.
+    stats = ProfileStats.get_for(author)
+    return stats.followers_count >= TIMELINE_FANOUT_LIMIT
+
+
+def fan_out(post):
+    if post.pulled:
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True
+    )
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers.iterator()),
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user, author):
+    """
+    Последние посты автора появляются в ленте сразу после подписки.
+    Берутся только TIMELINE_BACKFILL свежих: более ранние остаются в
+    профиле автора, о чём говорит последняя страница ленты. Посты с
+    пометкой pulled и так подмешиваются при чтении.
+    """
+    posts = Post.objects.filter(author=author, pulled=False).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:TIMELINE_BACKFILL]
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user.pk, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts),
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild(user):
+    TimelineEntry.objects.filter(user=user).delete()
+    for follow in Follow.objects.filter(user=user).select_related('author'):
+        backfill(user, follow.author)
+
+
+def trim(user_id):
+    """Удаляет записи ленты старше TIMELINE_MAX_ENTRIES последних."""
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    oldest = entries.order_by('-pub_date', '-post_id').values_list(
+        'pub_date', 'post_id'
+    )[TIMELINE_MAX_ENTRIES:TIMELINE_MAX_ENTRIES + 1]
+    if not oldest:
+        return 0
+    pub_date, post_id = oldest[0]
+    deleted, _ = entries.filter(
+        pub_date__lte=pub_date
+    ).exclude(
+        pub_date=pub_date, post_id__gt=post_id
+    ).delete()
+    return deleted
+
+
+def pulled_posts(user, posts):
+    """Посты с пометкой pulled от авторов, на которых подписан user."""
+    return posts.filter(
+        pulled=True,
+        author__in=Follow.objects.filter(user=user).values('author_id'),
+    )
+
+
+class TimelinePaginator(CursorPaginator):
+    """
+    Курсор по ленте подписок. Записи ленты читаются по индексу
+    (user, -pub_date, -post) без сортировки, посты с пометкой pulled -
+    отдельным запросом с тем же курсором по индексу
+    (author, pulled, -pub_date, -id): сортируются только они, а не все
+    посты подписок. Обе выборки по per_page + 1 строк сливаются по
+    (pub_date, id). Пост может оказаться в обеих (его записали при
+    подписке), дубли отбрасываются.
+    """
+
+    def __init__(self, user, posts, per_page):
+        super().__init__(pulled_posts(user, posts), per_page)
+        self.posts = posts
+        self.entries = TimelineEntry.objects.filter(user=user).order_by(
+            '-pub_date', '-post_id'
+        )
+
+    def rows(self, values=None, direction=NEXT):
+        forward = direction == NEXT
+        entries = self.entries
+        if values is not None:
+            entries = entries.filter(
+                self._after(values, forward, ('pub_date', 'post'))
+            )
+        if not forward:
+            entries = entries.reverse()
+        keys = dict(
+            (post_id, (pub_date, post_id))
+            for pub_date, post_id in entries.values_list(
+                'pub_date', 'post_id'
+            )[:self.per_page + 1]
+        )
+        loaded = {post.pk: post for post in super().rows(values, direction)}
+        keys.update((pk, (post.pub_date, pk)) for pk, post in loaded.items())
+        ids = sorted(keys, key=keys.get, reverse=forward)[:self.per_page + 1]
+        missing = [pk for pk in ids if pk not in loaded]
+        if missing:
+            loaded.update(self.posts.in_bulk(missing))
+        # Пост могли удалить между двумя запросами.
+        return [loaded[pk] for pk in ids if pk in loaded]
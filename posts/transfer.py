@@ -0,0 +1,245 @@
+"""
+Потоковый перенос постов, комментариев и подписок в JSON Lines и CSV.
+
+Строка файла - одна запись с полем model. Авторы и группы передаются
+по username и slug, id постов и комментариев сохраняются, поэтому
+комментарии ссылаются на посты из того же файла, а загрузка идёт
+только в пустую базу. В памяти держится только текущая пачка строк.
+"""
+import csv
+import json
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import search
+from posts.cache import FEED, bump_versions
+from posts.models import Comment, Follow, Group, Post, User, bulk_insert_raw
+
+# Порядок важен: комментарии ссылаются на посты.
+MODELS = ('post', 'comment', 'follow')
+EXPORT = {
+    'post': (Post, {
+        'id': 'id',
+        'text': 'text',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'pub_date': 'pub_date',
+        'image': 'image',
+    }),
+    'comment': (Comment, {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    'follow': (Follow, {
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+}
+
+
+def export_rows(model, batch_size):
+    """Строки одной модели по порядку id, кусками по batch_size."""
+    queryset, fields = EXPORT[model]
+    rows = queryset.objects.order_by('pk').values_list(*fields.values())
+    for values in rows.iterator(chunk_size=batch_size):
+        row = {'model': model, **dict(zip(fields, values))}
+        for name in ('pub_date', 'created'):
+            if row.get(name) is not None:
+                row[name] = row[name].isoformat()
+        yield row
+
+
+def write_jsonl(rows, stream, model):
+    count = 0
+    for count, row in enumerate(rows, 1):
+        stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+    return count
+
+
+def write_csv(rows, stream, model):
+    writer = csv.DictWriter(stream, ('model', *EXPORT[model][1]))
+    writer.writeheader()
+    count = 0
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+    return count
+
+
+def read_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        # В CSV нет null: пустая ячейка - отсутствующее значение.
+        yield {key: value or None for key, value in row.items()}
+
+
+WRITERS = {'jsonl': write_jsonl, 'csv': write_csv}
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
+
+
+def has_data():
+    """Импорт переносит id, поэтому грузится только в пустые таблицы."""
+    return any(model.objects.exists() for model in (Post, Comment, Follow))
+
+
+def reset_sequences():
+    """
+    После вставки с явными id последовательности Postgres отстают от
+    таблиц, и следующий INSERT получил бы занятый id. На SQLite
+    выравнивать нечего.
+    """
+    statements = connection.ops.sequence_reset_sql(
+        no_style(), [Post, Comment]
+    )
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+class Importer:
+    """
+    Копит строки по моделям и сохраняет их пачками, каждая пачка в своей
+    транзакции. Комментарии к постам, которых нет ни в файле, ни в базе,
+    пропускаются и считаются в skipped.
+    """
+
+    def __init__(self, batch_size, on_flush=None):
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self.batches = {model: [] for model in MODELS}
+        self.counts = dict.fromkeys(MODELS, 0)
+        self.skipped = dict.fromkeys(MODELS, 0)
+
+    def add(self, row):
+        model = row.get('model')
+        if model not in self.batches:
+            raise ValueError(f'Неизвестная модель: {model!r}')
+        batch = self.batches[model]
+        batch.append(row)
+        if len(batch) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model=MODELS[-1]):
+        # Сначала сохраняются пачки моделей, на которые ссылается эта.
+        for name in MODELS[:MODELS.index(model) + 1]:
+            rows = self.batches[name]
+            if not rows:
+                continue
+            with transaction.atomic():
+                objects = getattr(self, f'build_{name}s')(rows)
+                if objects:
+                    self.save(name, objects)
+            bump_versions(FEED)
+            self.counts[name] += len(objects)
+            self.skipped[name] += len(rows) - len(objects)
+            self.batches[name] = []
+            if self.on_flush:
+                self.on_flush(name, len(objects))
+
+    def save(self, name, objects):
+        if name == 'follow':
+            # Пара, повторившаяся в другой пачке, уже записана.
+            Follow.objects.bulk_create(objects, ignore_conflicts=True)
+        else:
+            # Вставка raw: даты из файла не затирает auto_now_add.
+            bulk_insert_raw(objects)
+
+    def users(self, rows, *fields):
+        """id пользователей по username; недостающие создаются."""
+        names = {row[field] for row in rows for field in fields}
+        users = dict(User.objects.filter(username__in=names).values_list(
+            'username', 'id'
+        ))
+        missing = names - set(users)
+        if missing:
+            User.objects.bulk_create(
+                User(username=name, password=make_password(None))
+                for name in missing
+            )
+            users.update(User.objects.filter(
+                username__in=missing
+            ).values_list('username', 'id'))
+        return users
+
+    def groups(self, rows):
+        slugs = {row['group'] for row in rows if row.get('group')}
+        groups = dict(Group.objects.filter(slug__in=slugs).values_list(
+            'slug', 'id'
+        ))
+        missing = slugs - set(groups)
+        if missing:
+            Group.objects.bulk_create(
+                Group(slug=slug, title=slug, description='')
+                for slug in missing
+            )
+            groups.update(Group.objects.filter(
+                slug__in=missing
+            ).values_list('slug', 'id'))
+        return groups
+
+    @staticmethod
+    def date(value):
+        return parse_datetime(value) if value else timezone.now()
+
+    def build_posts(self, rows):
+        users = self.users(rows, 'author')
+        groups = self.groups(rows)
+        return [
+            Post(
+                id=row['id'],
+                text=row['text'],
+                author_id=users[row['author']],
+                group_id=groups.get(row.get('group')),
+                pub_date=self.date(row.get('pub_date')),
+                image=row.get('image') or '',
+            )
+            for row in rows
+        ]
+
+    def build_comments(self, rows):
+        posts = set(Post.objects.filter(
+            pk__in={int(row['post']) for row in rows}
+        ).values_list('pk', flat=True))
+        rows = [row for row in rows if int(row['post']) in posts]
+        users = self.users(rows, 'author')
+        return [
+            Comment(
+                id=row.get('id'),
+                post_id=row['post'],
+                author_id=users[row['author']],
+                text=row['text'],
+                created=self.date(row.get('created')),
+            )
+            for row in rows
+        ]
+
+    def build_follows(self, rows):
+        users = self.users(rows, 'user', 'author')
+        pairs = {(users[row['user']], users[row['author']]) for row in rows}
+        return [
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs
+        ]
+
+
+def rebuild(stdout=None):
+    """
+    bulk_create не шлёт сигналов: после загрузки заново строятся
+    счётчики, ленты подписок и поисковый индекс.
+    """
+    call_command('recount_stats', stdout=stdout)
+    call_command('rebuild_timelines', stdout=stdout)
+    if search.enabled():
+        call_command('rebuild_search_index', stdout=stdout)
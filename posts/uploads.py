@@ -0,0 +1,149 @@
+"""
+Приём и обработка загруженных картинок.
+
+CappedUploadHandler пишет каждый файл запроса прямо во временный файл
+и бросает запись, как только файл перерос IMAGE_UPLOAD_MAX_BYTES:
+ни целиком в памяти, ни целиком на диске большой файл не оказывается.
+В запросе форма проверяет только заголовок картинки (формат и размеры).
+
+Декодирование, поворот по EXIF, удаление метаданных и пережатие
+делает фоновый пул после коммита, он же заказывает варианты под
+srcset (posts.variants) и прогревает миниатюры sorl: на них шаблоны
+откатываются, когда вариантов нет. Пока пул не закончил, у поста
+image_ready=False, и вместо картинки шаблоны показывают заглушку.
+Картинки, которые пул потерял при перезапуске или не смог обработать,
+подбирает команда process_images.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from posts import cache, thumbnails, variants
+from posts.models import Post
+from posts.settings import (IMAGE_JPEG_QUALITY, IMAGE_MAX_SIDE,
+                            IMAGE_UPLOAD_MAX_BYTES, IMAGE_WORKERS)
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=IMAGE_WORKERS, thread_name_prefix='images'
+)
+
+
+class CappedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Как TemporaryFileUploadHandler, но с потолком размера файла.
+    Переросший файл обрезается до нуля и помечается oversized,
+    а остаток его данных просто отбрасывается.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file.oversized = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.file.oversized:
+            return None
+        if start + len(raw_data) > IMAGE_UPLOAD_MAX_BYTES:
+            self.file.oversized = True
+            self.file.seek(0)
+            self.file.truncate()
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+
+def stripped(image):
+    """
+    Пережатая копия картинки: повёрнута по EXIF, без метаданных,
+    не больше IMAGE_MAX_SIDE по длинной стороне. Возвращает байты
+    и расширение; картинки с прозрачностью остаются в PNG.
+    """
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+    buffer = BytesIO()
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image.convert('RGBA').save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue(), 'png'
+    image.convert('RGB').save(
+        buffer, 'JPEG', quality=IMAGE_JPEG_QUALITY,
+        optimize=True, progressive=True,
+    )
+    return buffer.getvalue(), 'jpg'
+
+
+def process(post):
+    """Заменяет картинку поста обработанной копией."""
+    original = post.image.name
+    with post.image.open('rb'), Image.open(post.image) as image:
+        if getattr(image, 'is_animated', False):
+            # Анимацию не трогаем: пережатие оставило бы один кадр.
+            data = None
+        else:
+            data, extension = stripped(image)
+    name = original
+    storage = post.image.storage
+    if data is not None:
+        stem = os.path.splitext(original)[0]
+        name = storage.save(f'{stem}.{extension}', ContentFile(data))
+    # Пока шла обработка, автор мог сменить картинку. Лишний файл -
+    # исходник или копию для сменённой картинки - здесь не удаляем:
+    # на исходник ещё могут ссылаться страницы из кэша и соседний пост
+    # с той же картинкой. Его уберёт gc_media, когда файл состарится.
+    updated = Post.objects.filter(pk=post.pk, image=original).update(
+        image=name, image_ready=True, image_failed=False
+    )
+    if not updated:
+        return None
+    cache.bump_versions(cache.FEED, cache.post_scope(post.pk))
+    post.image.name = name
+    return post
+
+
+def run(post_id):
+    """
+    Обрабатывает картинку поста. Если картинку не удалось прочитать или
+    пережать, пост помечается image_failed, и вместо заглушки шаблоны
+    говорят об ошибке. Сбой вариантов и миниатюр пост не портит: их
+    доделают generate_variants и warm_thumbnails.
+    """
+    post = Post.objects.only('image').filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    try:
+        post = process(post)
+    except Exception:
+        Post.objects.filter(pk=post_id, image=post.image.name).update(
+            image_failed=True
+        )
+        cache.bump_versions(cache.FEED, cache.post_scope(post_id))
+        raise
+    if post is not None:
+        variants.generate(post)
+        # Миниатюры sorl нужны там, где вариантов нет.
+        thumbnails.warm(post.image)
+
+
+def process_post(post_id):
+    try:
+        run(post_id)
+    except Exception:
+        logger.exception('Не удалось обработать картинку поста %s', post_id)
+    finally:
+        # Соединения потока пула сами не закрываются.
+        connections.close_all()
+
+
+def schedule(post):
+    """
+    После коммита отдаёт картинку поста фоновому пулу. Очередь пула
+    живёт в памяти: задачи, потерянные при перезапуске, подбирает
+    команда process_images.
+    """
+    post_id = post.pk
+    transaction.on_commit(lambda: _executor.submit(process_post, post_id))
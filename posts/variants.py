@@ -0,0 +1,122 @@
+"""
+Варианты картинок под <img srcset>.
+
+Для каждой обработанной картинки нарезаются ширины из
+IMAGE_VARIANT_WIDTHS в форматах IMAGE_VARIANT_FORMATS. Нарезка
+занимает процессор целиком, поэтому идёт в пуле процессов, а не
+потоков. Варианты привязаны к sha256 содержимого: одинаковая картинка
+в разных постах нарезается один раз.
+
+prefetch() достаёт варианты всей страницы ленты одним запросом и
+проставляет постам post.variants для шаблона.
+"""
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from posts import cache
+from posts.imaging import render_variants
+from posts.models import ImageVariant, Post
+from posts.settings import (IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_PROCESSES,
+                            IMAGE_VARIANT_QUALITY, IMAGE_VARIANT_RATIO,
+                            IMAGE_VARIANT_WIDTHS)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def render(data):
+    """Нарезка в пуле процессов; при IMAGE_VARIANT_PROCESSES=0 — здесь же."""
+    global _pool
+    args = (
+        data, IMAGE_VARIANT_WIDTHS, IMAGE_VARIANT_FORMATS,
+        IMAGE_VARIANT_RATIO, IMAGE_VARIANT_QUALITY,
+    )
+    if not IMAGE_VARIANT_PROCESSES:
+        return render_variants(*args)
+    with _pool_lock:
+        if _pool is None:
+            # Пул создаётся при первой нарезке, а не при импорте:
+            # иначе процессы заводил бы каждый воркер сайта. Под
+            # блокировкой: первые нарезки идут из нескольких потоков,
+            # и каждый завёл бы свой пул.
+            _pool = ProcessPoolExecutor(max_workers=IMAGE_VARIANT_PROCESSES)
+    return _pool.submit(render_variants, *args).result()
+
+
+def variant_name(digest, width, image_format):
+    extension = 'jpg' if image_format == 'jpeg' else image_format
+    return f'variants/{digest[:2]}/{digest}-{width}.{extension}'
+
+
+def generate(post):
+    """
+    Проставляет посту хэш картинки и нарезает варианты, если для
+    этого хэша их ещё нет. Возвращает хэш.
+    """
+    with post.image.open('rb'):
+        data = post.image.read()
+    digest = hashlib.sha256(data).hexdigest()
+    if not ImageVariant.objects.filter(digest=digest).exists():
+        variants = []
+        for width, height, image_format, content in render(data):
+            name = variant_name(digest, width, image_format)
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(content))
+            variants.append(ImageVariant(
+                digest=digest, width=width, height=height,
+                format=image_format, file=name, size=len(content),
+            ))
+        ImageVariant.objects.bulk_create(variants, ignore_conflicts=True)
+    Post.objects.filter(pk=post.pk, image=post.image.name).update(
+        image_digest=digest
+    )
+    cache.bump_versions(cache.FEED, cache.post_scope(post.pk))
+    post.image_digest = digest
+    return digest
+
+
+class Srcset:
+    """Что нужно шаблону для <picture>: srcset по форматам и запасной src."""
+
+    def __init__(self, variants):
+        self.srcset = {}
+        for image_format in IMAGE_VARIANT_FORMATS:
+            self.srcset[image_format] = ', '.join(
+                f'{variant.file.url} {variant.width}w'
+                for variant in variants if variant.format == image_format
+            )
+        fallback = [
+            variant for variant in variants
+            if variant.format == IMAGE_VARIANT_FORMATS[-1]
+        ]
+        # Запасная картинка для браузеров без srcset — самая широкая.
+        self.src = fallback[-1] if fallback else variants[-1]
+
+    @property
+    def webp(self):
+        return self.srcset.get('webp', '')
+
+    @property
+    def jpeg(self):
+        return self.srcset.get('jpeg', '')
+
+
+def prefetch(posts):
+    """Проставляет постам с готовыми вариантами post.variants."""
+    by_digest = {}
+    for post in posts:
+        if post.image and post.image_ready and post.image_digest:
+            by_digest.setdefault(post.image_digest, []).append(post)
+    if not by_digest:
+        return
+    variants = {}
+    for variant in ImageVariant.objects.filter(digest__in=by_digest):
+        variants.setdefault(variant.digest, []).append(variant)
+    for digest, found in variants.items():
+        srcset = Srcset(found)
+        for post in by_digest[digest]:
+            post.variants = srcset
@@ -1,18 +1,34 @@
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.http import urlencode
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import condition
 
-from posts.settings import POSTS_QUANTITY
+from yatube.database import check_databases, replica_reads, sticky_writes
+from yatube.performance import query_budget
 
+from . import comment_queue, variants
+from .cache import (feed_etag, follow_etag, post_etag, prepare_feed,
+                    profile_etag, timeline_scope)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Follow, Group, Post, ProfileStats, User
+from .paginators import CursorPaginator, paginate
+from .search import search_posts
+from .settings import (COMMENTS_QUANTITY, POSTS_QUANTITY, TIMELINE_BACKFILL,
+                       TIMELINE_MAX_ENTRIES)
+from .timeline import TimelinePaginator
 
 
+# Сессия, пользователь, страница постов, варианты и миниатюры
+# картинок страницы.
+@query_budget(5)
+@replica_reads
+@condition(etag_func=feed_etag)
 def index(request):
-    posts = Post.objects.all()
-    paginator = Paginator(posts, POSTS_QUANTITY)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = prepare_feed(request, paginate(request, Post.objects.for_feed()))
     return render(
         request,
         'index.html',
@@ -20,12 +36,14 @@ def index(request):
     )
 
 
+# Сессия, пользователь, группа, страница постов, варианты,
+# миниатюры.
+@query_budget(6)
+@replica_reads
+@condition(etag_func=feed_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all().order_by('-pub_date',)
-    paginator = Paginator(posts, POSTS_QUANTITY)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = prepare_feed(request, paginate(request, group.posts.for_feed()))
     context = {
         'group': group,
         'page': page,
@@ -33,22 +51,49 @@ def group_posts(request, slug):
     return render(request, "group.html", context)
 
 
+# Сессия, пользователь, число найденных, id страницы, посты,
+# варианты, миниатюры.
+@query_budget(7)
+@replica_reads
+@condition(etag_func=feed_etag)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page = None
+    if query:
+        page = prepare_feed(request, Paginator(
+            search_posts(query), POSTS_QUANTITY
+        ).get_page(request.GET.get('page')))
+    context = {
+        'query': query,
+        'page': page,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'search.html', context)
+
+
+# Сессия, пользователь, INSERT поста, раздача подписчикам
+# (популярность автора, подписчики, INSERT в ленты), два запроса
+# к FTS, сдвиг счётчика постов.
+@query_budget(9)
 @login_required
 def new_post(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if not form.is_valid():
         return render(request, 'new.html', {'form': form})
     form.instance.author = request.user
-    form.save()
+    with transaction.atomic():
+        form.save()
     return redirect('index')
 
 
+# Сессия, пользователь, автор, страница постов, подписан ли
+# читатель, счётчики автора, варианты, миниатюры.
+@query_budget(8)
+@replica_reads
+@condition(etag_func=profile_etag)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    paginator = Paginator(posts, POSTS_QUANTITY)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = prepare_feed(request, paginate(request, author.posts.for_feed()))
     following = (
         request.user.is_authenticated and Follow.objects.filter(
             user=request.user, author=author
@@ -56,23 +101,72 @@ def profile(request, username):
     )
     context = {
         'author': author,
+        'stats': ProfileStats.cached_for(author),
         'page': page,
         'following': following,
     }
     return render(request, 'profile.html', context)
 
 
+def comments_paginator(post):
+    return CursorPaginator(
+        post.comments.for_thread(), COMMENTS_QUANTITY,
+        ordering=('created', 'id'),
+    )
+
+
+# Сессия, пользователь, пост с автором и группой, счётчики
+# автора, варианты, миниатюра, комментарии с авторами.
+@query_budget(7)
+@replica_reads
+@condition(etag_func=post_etag)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, id=post_id, author__username=username)
+    post = get_object_or_404(
+        Post.objects.for_feed(), id=post_id, author__username=username
+    )
+    variants.prefetch([post])
     form = CommentForm(request.POST or None)
+    # Под постом только начало ветки: страница вирусного поста
+    # не растёт с числом комментариев, остальные листаются отдельно,
+    # начиная с комментария после последнего показанного.
+    paginator = comments_paginator(post)
+    comments = post.comments.for_thread()[:COMMENTS_QUANTITY]
+    more_comments = post.comment_count > len(comments) > 0
     context = {
         'author': post.author,
+        'stats': ProfileStats.cached_for(post.author),
         'post': post,
+        'comments': comments,
+        'more_comments': more_comments,
+        'comments_cursor': paginator.cursor_after(
+            comments[len(comments) - 1]
+        ) if more_comments else None,
+        'pending_comments': comment_queue.pending_for(request.user, post.id),
         'form': form,
     }
     return render(request, 'post.html', context)
 
 
+# Сессия, пользователь, пост, страница комментариев.
+@query_budget(4)
+@replica_reads
+@condition(etag_func=post_etag)
+def post_comments(request, username, post_id):
+    post = get_object_or_404(
+        Post.objects.for_feed(), id=post_id, author__username=username
+    )
+    paginator = comments_paginator(post)
+    context = {
+        'author': post.author,
+        'post': post,
+        'page': paginator.get_page(request.GET.get('cursor')),
+    }
+    return render(request, 'post_comments.html', context)
+
+
+# Сессия, пользователь, пост, UPDATE, два запроса к FTS;
+# на форме вместо записи - список групп.
+@query_budget(6)
 @login_required
 def post_edit(request, username, post_id):
     if username != request.user.username:
@@ -100,48 +194,95 @@ def server_error(request):
     return render(request, "misc/500.html", status=500)
 
 
+@never_cache
+def health(request):
+    """Проверка для балансировщика: 503, если база недоступна."""
+    errors = check_databases()
+    return JsonResponse(
+        {'status': 'error' if errors else 'ok', 'databases': errors},
+        status=503 if errors else 200,
+    )
+
+
+# Сессия, пользователь, пост, INSERT, два запроса к FTS,
+# сдвиг счётчика комментариев; с очередью - только сессия,
+# пользователь и пост.
+@query_budget(7)
 @login_required
 def add_comment(request, username, post_id):
     post = get_object_or_404(Post, id=post_id, author__username=username)
-    if not request.user:
-        return redirect('login')
     form = CommentForm(request.POST or None)
-    context = {'form': form, 'post': post}
     if not form.is_valid():
-        form = CommentForm()
-        return render(request, 'comments.html', context)
-    form.instance.author = get_object_or_404(
-        User, username=request.user.username
-    )
+        return render(request, 'comments.html', {'form': form, 'post': post})
     comment = form.save(commit=False)
     comment.author = request.user
     comment.post = post
-    comment.save()
+    if comment_queue.enabled():
+        comment_queue.enqueue(comment)
+        return redirect('post', username=username, post_id=post_id)
+    with transaction.atomic():
+        comment.save()
     return redirect('post', username=username, post_id=post_id)
 
 
+# Сессия, пользователь, записи ленты по индексу, подмешанные посты,
+# посты из записей, варианты, миниатюры.
+@query_budget(7)
+@replica_reads
 @login_required
+@condition(etag_func=follow_etag)
 def follow_index(request):
-    following_posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(following_posts, POSTS_QUANTITY)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    paginator = TimelinePaginator(
+        request.user, Post.objects.for_feed(), POSTS_QUANTITY
+    )
+    page = prepare_feed(
+        request,
+        paginator.get_page(request.GET.get('cursor')),
+        timeline_scope(request.user.id),
+    )
     context = {
         'page': page,
+        'backfill_limit': TIMELINE_BACKFILL,
+        'timeline_limit': TIMELINE_MAX_ENTRIES,
     }
     return render(request, "follow.html", context)
 
 
+# Сессия, пользователь, автор, поиск подписки, INSERT, посты автора,
+# INSERT в ленту, два сдвига счётчиков. Строки ProfileStats есть у всех
+# (миграция 0022); без строки подсчёт добавит запросы, и превышение
+# после записи только попадёт в лог.
+@query_budget(9)
 @login_required
+@sticky_writes
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if request.user != author:
+    if request.user == author:
+        return redirect('profile', username=username)
+    with transaction.atomic():
+        # При гонке двух запросов второй INSERT упрётся в unique_follow,
+        # и get_or_create вернёт уже созданную подписку, а счётчики
+        # сдвинет только первый (signals.count_follow).
         Follow.objects.get_or_create(author=author, user=request.user)
     return redirect('profile', username=username)
 
 
+# Сессия, пользователь, автор, поиск подписки, DELETE,
+# чистка ленты, два сдвига счётчиков.
+@query_budget(8)
 @login_required
+@sticky_writes
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(author=author, user=request.user).delete()
+    with transaction.atomic():
+        # Строка блокируется до конца транзакции: параллельная отписка
+        # её уже не найдёт и не сдвинет счётчики второй раз.
+        follow = Follow.objects.select_for_update().filter(
+            author=author, user=request.user
+        ).first()
+        if follow is not None:
+            # Автор и читатель уже загружены: signals.uncount_follow
+            # берёт их имена отсюда, а не отдельными запросами.
+            follow.author, follow.user = author, request.user
+            follow.delete()
     return redirect('profile', username=username)
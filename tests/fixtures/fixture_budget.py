@@ -0,0 +1,30 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+
+@pytest.fixture
+def assert_query_budget():
+    """
+    Проверяет, что вьюха укладывается в свой query_budget на каждом
+    размере данных: seed(size) досыпает данные перед запросом, кэш
+    очищается, чтобы страница честно отрисовалась заново.
+    """
+    def check(client, url, seed, sizes=(1, 5, 20)):
+        view = resolve(url.split('?')[0]).func
+        budget = getattr(view, 'query_budget', None)
+        assert budget is not None, f'У вьюхи для `{url}` не объявлен query_budget'
+        for size in sizes:
+            seed(size)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            assert response.status_code == 200, f'`{url}` ответил {response.status_code}'
+            sql = '\n'.join(query['sql'] for query in queries.captured_queries)
+            assert len(queries) <= budget, (
+                f'`{url}` при {size} записях сделал {len(queries)} SQL-запросов '
+                f'при бюджете {budget}:\n{sql}'
+            )
+    return check
@@ -0,0 +1,44 @@
+import pytest
+
+from posts.models import Comment, Follow, Post
+
+
+@pytest.fixture
+def seed(mixer, user, another_user, group):
+    """Посты другого автора в группе, у каждого комментарии разных людей."""
+    Follow.objects.create(user=user, author=another_user)
+
+    def seed(size):
+        commenters = mixer.cycle(3).blend('auth.User')
+        for post in mixer.cycle(size).blend(Post, author=another_user, group=group, image=''):
+            for commenter in commenters:
+                Comment.objects.create(post=post, author=commenter, text='Комментарий')
+    return seed
+
+
+class TestQueryBudget:
+
+    @pytest.mark.django_db(transaction=True)
+    @pytest.mark.parametrize('url', [
+        '/',
+        '/?page=1',
+        '/group/test-link/',
+        '/AnotherUser/',
+        '/follow/',
+        '/search/?q=a',
+    ])
+    def test_feed_pages(self, user_client, url, seed, assert_query_budget):
+        assert_query_budget(user_client, url, seed)
+
+    @pytest.mark.django_db(transaction=True)
+    @pytest.mark.parametrize('suffix', ['', 'comments/'])
+    def test_post_view(self, user_client, another_user, seed, assert_query_budget, suffix):
+        seed(1)
+        post = Post.objects.filter(author=another_user).first()
+        url = f'/{another_user.username}/{post.id}/{suffix}'
+
+        def add_comments(size):
+            for _ in range(size):
+                Comment.objects.create(post=post, author=another_user, text='Ещё')
+            seed(0)
+        assert_query_budget(user_client, url, add_comments)
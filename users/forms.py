@@ -1,10 +1,40 @@
+import re
+
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
+from django.core.exceptions import ValidationError
+from django.urls import URLResolver, get_resolver
 
 User = get_user_model()
 
+SEGMENT = re.compile(r"[\w.@+-]+")
+
+
+def reserved_usernames(patterns=None):
+    """
+    Первые сегменты адресов сайта (search, api, health, group...).
+    Эти адреса стоят в urls раньше профиля и перехватили бы страницы
+    пользователя с таким именем.
+    """
+    names = set()
+    for pattern in patterns or get_resolver().url_patterns:
+        route = str(pattern.pattern).lstrip("^")
+        if isinstance(pattern, URLResolver) and not route:
+            names |= reserved_usernames(pattern.url_patterns)
+            continue
+        segment = route.split("/")[0]
+        if "/" in route and SEGMENT.fullmatch(segment):
+            names.add(segment)
+    return names
+
 
 class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ("first_name", "last_name", "username", "email")
+
+    def clean_username(self):
+        username = self.cleaned_data["username"]
+        if username in reserved_usernames():
+            raise ValidationError("Это имя занято страницей сайта.")
+        return username
@@ -1,2 +1,22 @@
+from django.test import TestCase
 
-# Create your tests here.
+from .forms import CreationForm
+
+
+class CreationFormTest(TestCase):
+    def form(self, username):
+        return CreationForm(data={
+            "username": username,
+            "password1": "Yatube-secret-1",
+            "password2": "Yatube-secret-1",
+        })
+
+    def test_site_pages_are_not_usernames(self):
+        for username in ("health", "api", "search", "group", "follow"):
+            with self.subTest(username=username):
+                form = self.form(username)
+                self.assertFalse(form.is_valid())
+                self.assertIn("username", form.errors)
+
+    def test_regular_username(self):
+        self.assertTrue(self.form("searcher").is_valid())
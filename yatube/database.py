@@ -0,0 +1,134 @@
+"""
+Настройка соединений с базой.
+
+SQLite по умолчанию держит журнал отката: пишущая транзакция
+new_post или add_comment на время коммита блокирует всех читателей,
+а читатель не даёт писателю закоммитить. В режиме WAL читатели и
+писатель друг другу не мешают, а busy_timeout заставляет второго
+писателя подождать, а не сразу падать с «database is locked».
+Прагмы из SQLITE_PRAGMAS выставляются на каждом новом соединении.
+
+ReplicaRouter отправляет чтения вьюх, помеченных @replica_reads, на
+реплики из DATABASE_REPLICAS; всё остальное идёт в основную базу.
+После записи ReplicaMiddleware ставит куку, и ещё
+REPLICA_STICKY_SECONDS все чтения этого пользователя идут в основную
+базу: своя новая запись видна сразу, даже если реплика отстаёт.
+Кука ставится только на запись из POST и других небезопасных методов
+или из вьюх, помеченных @sticky_writes: попутные записи GET-страниц
+(сессия, недостающая строка счётчиков) реплику не отключают.
+"""
+import functools
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+STICKY_COOKIE = 'primary_db'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_local = threading.local()
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def check_databases():
+    """Ошибки соединений по алиасам; пустой словарь, если все живы."""
+    errors = {}
+    for alias in connections:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+        except DatabaseError as error:
+            errors[alias] = str(error)
+    return errors
+
+
+class ReplicaRouter:
+    # Сессию пишут на каждом входе, а на реплику она попадёт не сразу.
+    primary_apps = {'sessions'}
+
+    def db_for_read(self, model, **hints):
+        if (getattr(_local, 'replica', False)
+                and not getattr(_local, 'wrote', False)
+                and settings.DATABASE_REPLICAS
+                and model._meta.app_label not in self.primary_apps):
+            return random.choice(settings.DATABASE_REPLICAS)
+        # Явный ответ, иначе Django взял бы базу, из которой прочитан
+        # объект, и мог бы записать его на реплику.
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, связи между ними допустимы.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+def replica_reads(view):
+    """Вьюха только читает: её запросы можно отдать реплике."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if STICKY_COOKIE in request.COOKIES:
+            return view(request, *args, **kwargs)
+        _local.replica = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _local.replica = False
+    return wrapper
+
+
+def sticky_writes(view):
+    """
+    GET-вьюха меняет то, что пользователь ждёт увидеть (подписка):
+    её запись, как и POST, закрепляет его за основной базой.
+    """
+    view.sticky_writes = True
+    return view
+
+
+def changes_data(request):
+    if request.method not in SAFE_METHODS:
+        return True
+    match = request.resolver_match
+    return match is not None and getattr(match.func, 'sticky_writes', False)
+
+
+class ReplicaMiddleware:
+    """
+    Ставит куку STICKY_COOKIE ответу на запрос, который изменил данные
+    пользователя (changes_data) и что-то записал.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.wrote = False
+        try:
+            response = self.get_response(request)
+            wrote = _local.wrote
+        finally:
+            _local.wrote = False
+        if wrote and settings.DATABASE_REPLICAS and changes_data(request):
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
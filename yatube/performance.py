@@ -0,0 +1,261 @@
+"""
+Лёгкие замеры каждого запроса для продакшена, где debug_toolbar нет.
+
+PerformanceMiddleware собирает время ответа, число и время SQL-запросов,
+попадания и промахи кэша и время отрисовки шаблонов. Итог уходит в
+заголовок Server-Timing и строкой key=value в логгер yatube.performance.
+У медленных запросов (дольше PERFORMANCE_SLOW_REQUEST_MS) в лог
+попадает и их SQL.
+
+Кэш и шаблоны считаются обёртками, которые подключаются в настройках:
+InstrumentedCache оборачивает настоящий бэкенд из WRAPPED_BACKEND,
+InstrumentedTemplates заменяет стандартный движок шаблонов.
+"""
+import logging
+import re
+import random
+import threading
+import time
+from contextlib import ContextDecorator, ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('yatube.performance')
+
+_local = threading.local()
+_MISSING = object()
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.queries = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.db_count += 1
+            self.db_time += duration
+            if len(self.queries) < settings.PERFORMANCE_MAX_QUERIES:
+                self.queries.append((duration, sql))
+
+
+def current():
+    """Замеры текущего запроса или None вне запроса."""
+    return getattr(_local, 'metrics', None)
+
+
+SAVEPOINT = re.compile(r'(RELEASE |ROLLBACK TO )?SAVEPOINT ')
+WRITE = re.compile(r'(INSERT|UPDATE|DELETE|REPLACE) ', re.IGNORECASE)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class query_budget(ContextDecorator):
+    """
+    Объявленный потолок числа SQL-запросов для вьюхи или блока кода:
+
+        @query_budget(6)
+        def post_view(request, username, post_id):
+
+    При превышении пишет предупреждение в yatube.performance, а при
+    QUERY_BUDGET_RAISE бросает QueryBudgetExceeded. Потолок вьюхи виден
+    тестам как view.query_budget.
+
+    Если блок уже что-то записал, превышение только пишется в лог:
+    исключение превратило бы выполненную запись в ответ 500.
+
+    Точки сохранения не считаются: это управление транзакцией, и их
+    число зависит от того, открыта ли уже транзакция снаружи (в тестах
+    TestCase - всегда).
+    """
+
+    def __init__(self, limit, name=None):
+        self.limit = limit
+        self.name = name
+
+    def __call__(self, func):
+        self.name = self.name or f'{func.__module__}.{func.__qualname__}'
+        wrapped = super().__call__(func)
+        wrapped.query_budget = self.limit
+        return wrapped
+
+    def _recreate_cm(self):
+        # Своё состояние на каждый вызов: вьюху зовут из разных потоков.
+        return type(self)(self.limit, self.name)
+
+    def count(self, execute, sql, params, many, context):
+        if not SAVEPOINT.match(sql):
+            self.queries.append(sql)
+            self.wrote = self.wrote or bool(WRITE.match(sql))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.queries = []
+        self.wrote = False
+        self.stack = ExitStack()
+        for connection in connections.all():
+            self.stack.enter_context(connection.execute_wrapper(self.count))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+        if len(self.queries) <= self.limit or exc_info[0] is not None:
+            return False
+        message = (
+            f'{self.name or "блок"}: {len(self.queries)} SQL-запросов '
+            f'при бюджете {self.limit}'
+        )
+        if settings.QUERY_BUDGET_RAISE and not self.wrote:
+            raise QueryBudgetExceeded(
+                message + ''.join(f'\n  {sql}' for sql in self.queries)
+            )
+        logger.warning(message, extra={'queries': self.queries})
+        return False
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = _local.metrics = Metrics()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.record_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        total = time.perf_counter() - metrics.started
+        if self.show_timing(request):
+            response['Server-Timing'] = ', '.join((
+                f'app;dur={total * 1000:.1f}',
+                f'db;dur={metrics.db_time * 1000:.1f};'
+                f'desc="{metrics.db_count} queries"',
+                f'tpl;dur={metrics.template_time * 1000:.1f}',
+                f'cache;desc="{metrics.cache_hits} hits, '
+                f'{metrics.cache_misses} misses"',
+            ))
+        self.log(request, response, metrics, total)
+        return response
+
+    @staticmethod
+    def show_timing(request):
+        """
+        Server-Timing раскрывает устройство сайта: заголовок получают
+        все только при PERFORMANCE_SERVER_TIMING, иначе - INTERNAL_IPS
+        и сотрудники.
+        """
+        if settings.PERFORMANCE_SERVER_TIMING:
+            return True
+        if request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS:
+            return True
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+    def log(self, request, response, metrics, total):
+        match = request.resolver_match
+        data = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else '-',
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'db_queries': metrics.db_count,
+            'db_ms': round(metrics.db_time * 1000, 1),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+            'template_ms': round(metrics.template_time * 1000, 1),
+        }
+        line = ' '.join(f'{key}={value}' for key, value in data.items())
+        slow = data['total_ms'] >= settings.PERFORMANCE_SLOW_REQUEST_MS
+        if not slow:
+            logger.info(line, extra={'performance': data})
+            return
+        if random.random() < settings.PERFORMANCE_SLOW_SAMPLE_RATE:
+            data['sql'] = [
+                {'ms': round(duration * 1000, 1), 'sql': sql}
+                for duration, sql in sorted(metrics.queries, reverse=True)
+            ]
+            line += ''.join(
+                f'\n  {query["ms"]} ms: {query["sql"]}'
+                for query in data['sql']
+            )
+        logger.warning('slow ' + line, extra={'performance': data})
+
+
+class InstrumentedCache:
+    """
+    Обёртка над бэкендом кэша, считающая попадания и промахи:
+
+        'BACKEND': 'yatube.performance.InstrumentedCache',
+        'WRAPPED_BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    """
+
+    def __init__(self, location, params):
+        params = dict(params)
+        backend = import_string(params.pop('WRAPPED_BACKEND'))
+        self._cache = backend(location, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+    @staticmethod
+    def _count(hits, misses):
+        metrics = current()
+        if metrics is not None:
+            metrics.cache_hits += hits
+            metrics.cache_misses += misses
+
+    def get(self, key, default=None, version=None):
+        value = self._cache.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count(0, 1)
+            return default
+        self._count(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self._cache.get_many(keys, version=version)
+        self._count(len(found), len(keys) - len(found))
+        return found
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = current()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """DjangoTemplates, замеряющий отрисовку шаблонов запроса."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -25,6 +25,7 @@ ALLOWED_HOSTS = [
 
 INSTALLED_APPS = [
     'about',
+    'api',
     'users',
     'posts.apps.PostsConfig',
     'django.contrib.admin',
@@ -40,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.performance.PerformanceMiddleware',
+    'yatube.database.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,7 +62,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'yatube.performance.InstrumentedTemplates',
         'DIRS': [
             TEMPLATES_DIR,
             'templates/includes',
@@ -70,6 +73,7 @@ TEMPLATES = [
         'OPTIONS': {
             'context_processors': [
                 'users.context_processors.year',
+                'posts.context_processors.cache_timeouts',
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -85,13 +89,67 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# База выбирается переменными окружения DB_ENGINE, DB_NAME, DB_USER,
+# DB_PASSWORD, DB_HOST, DB_PORT; по умолчанию SQLite рядом с проектом.
+
+DB_ENGINES = {
+    'sqlite': 'django.db.backends.sqlite3',
+    'postgresql': 'django.db.backends.postgresql',
+    'mysql': 'django.db.backends.mysql',
+}
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'ENGINE': DB_ENGINES[DB_ENGINE],
+        'NAME': os.environ.get(
+            'DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
+        'USER': os.environ.get('DB_USER', ''),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', ''),
+        'PORT': os.environ.get('DB_PORT', ''),
+        # Соединение переживает запрос и не открывается заново каждый раз.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
     }
 }
 
+# Реплики для чтения: DB_REPLICAS через запятую, хосты реплик
+# (для SQLite — пути к файлам). Чтения получают только вьюхи с
+# @replica_reads, а после записи пользователь REPLICA_STICKY_SECONDS
+# читает из основной базы.
+
+for index, location in enumerate(
+    filter(None, os.environ.get('DB_REPLICAS', '').split(','))
+):
+    DATABASES[f'replica{index}'] = dict(
+        DATABASES['default'],
+        **{'NAME' if DB_ENGINE == 'sqlite' else 'HOST': location},
+        TEST={'MIRROR': 'default'},
+    )
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['yatube.database.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
+# Прагмы каждого нового соединения с SQLite (yatube.database).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+    'mmap_size': 128 * 1024 * 1024,
+}
+
+# Отложенная запись комментариев (posts.comment_queue): add_comment
+# кладёт комментарий в локальную очередь-файл SQLite, а фоновый поток
+# пишет их в базу пачками. Включается COMMENT_QUEUE=1. Очередь у
+# каждого хоста своя: несколько хостов требуют закрепления пользователя.
+
+COMMENT_QUEUE = os.environ.get('COMMENT_QUEUE', '') == '1'
+COMMENT_QUEUE_PATH = os.environ.get(
+    'COMMENT_QUEUE_PATH', os.path.join(BASE_DIR, 'comment_queue.sqlite3')
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -134,6 +192,8 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Файлы сразу пишутся во временный файл, с потолком размера.
+FILE_UPLOAD_HANDLERS = ['posts.uploads.CappedUploadHandler']
 
 # Login
 
@@ -145,10 +205,77 @@ LOGOUT_REDIRECT_URL = 'index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
-CACHES = {
-    'default': {
+# Cache
+# Общий для всех воркеров кэш выбирается переменной окружения
+# CACHE_BACKEND; locmem годится только для тестов и одного процесса.
+
+CACHE_BACKENDS = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'yatube_cache',
+    },
+    'memcached': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': '127.0.0.1:11211',
+    },
+    'redis': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+    },
+}
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHES = {
+    'default': dict(
+        CACHE_BACKENDS[CACHE_BACKEND],
+        # Обёртка считает попадания и промахи для PerformanceMiddleware.
+        BACKEND='yatube.performance.InstrumentedCache',
+        WRAPPED_BACKEND=CACHE_BACKENDS[CACHE_BACKEND]['BACKEND'],
+        KEY_PREFIX='yatube',
+    ),
+}
+if os.environ.get('CACHE_LOCATION'):
+    CACHES['default']['LOCATION'] = os.environ['CACHE_LOCATION']
+
+# Замеры запросов (yatube.performance)
+# Запросы дольше PERFORMANCE_SLOW_REQUEST_MS пишутся в лог вместе с SQL,
+# у доли PERFORMANCE_SLOW_SAMPLE_RATE из них. Заголовок Server-Timing
+# при PERFORMANCE_SERVER_TIMING получают все, иначе только INTERNAL_IPS
+# и сотрудники.
+
+PERFORMANCE_SERVER_TIMING = DEBUG
+PERFORMANCE_SLOW_REQUEST_MS = float(
+    os.environ.get('PERFORMANCE_SLOW_REQUEST_MS', 500)
+)
+PERFORMANCE_SLOW_SAMPLE_RATE = float(
+    os.environ.get('PERFORMANCE_SLOW_SAMPLE_RATE', 1.0)
+)
+PERFORMANCE_MAX_QUERIES = 200
+# Превышение query_budget: при разработке - исключение, иначе - лог.
+QUERY_BUDGET_RAISE = DEBUG
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'yatube.performance': {
+            'handlers': ['console'],
+            # INFO - строка на каждый запрос, WARNING - только медленные.
+            'level': os.environ.get('PERFORMANCE_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
 }
 
 REST_FRAMEWORK = {
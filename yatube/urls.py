@@ -13,10 +13,12 @@ handler500 = 'posts.views.server_error'   # noqa
 urlpatterns = [
     path('404/', views.server_error),
     path('500/', views.page_not_found),
+    path('health/', views.health, name='health'),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('admin/', admin.site.urls),
     path('about/', include('about.urls', namespace='about')),
+    path('api/', include('api.urls')),
     path('', include('posts.urls')),
 ]
 